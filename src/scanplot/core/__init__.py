@@ -8,5 +8,6 @@ from .process_template import (
     image_tresholding,
     reconstruct_template_mask,
 )
+from .r_table import RTable
 from .scanplot_api import Plot
 from .template_match import template_match
@@ -0,0 +1,276 @@
+import logging
+import multiprocessing
+import pathlib
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from scanplot.io import load_image
+from scanplot.types import (
+    ArrayN,
+    ArrayNx2,
+    ConverterParameters,
+    DetectionParameters,
+    ImageLike,
+    PathLike,
+)
+
+from .coords_converter import CoordinatesConverter
+from .detector import Detector
+from .scanplot_api import Plot
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"}
+
+# (shared memory name, shape, dtype)
+SharedImage = Tuple[str, Tuple[int, ...], str]
+
+
+@dataclass
+class ImageDetections:
+    """
+    Detections on a single plot image
+
+    :param detections: marker label -> points (x, y) in pixels
+    :param scores: marker label -> correlation map values of points
+    :param factual_detections: marker label -> points converted to real values
+        (only if converter parameters are specified)
+    :param error: error message, if image processing failed
+    """
+
+    image_path: str
+    detections: dict[str, ArrayNx2]
+    scores: dict[str, ArrayN]
+    factual_detections: dict[str, ArrayNx2] | None = None
+    error: str | None = None
+
+
+def find_plot_images(image_dir: PathLike) -> List[pathlib.Path]:
+    """
+    Return sorted paths of images in directory
+    """
+    image_dir = pathlib.Path(image_dir)
+    if not image_dir.is_dir():
+        raise FileNotFoundError(f"No such directory: {str(image_dir)}")
+    return sorted(
+        p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+
+def load_marker_templates(
+    marker_dir: PathLike, image_path: PathLike
+) -> dict[str, ImageLike]:
+    """
+    Load marker templates of plot image saved by `io.save_markers`
+     (files '<image name>_marker<i>.png', e.g. datasets/marker_images)
+    """
+    stem = pathlib.Path(image_path).stem
+    marker_paths = sorted(
+        pathlib.Path(marker_dir).glob(f"{stem}_marker*.png"),
+        key=lambda p: int(p.stem.rsplit("marker", 1)[1]),
+    )
+    return {f"marker{i + 1}": load_image(p) for i, p in enumerate(marker_paths)}
+
+
+def iter_batch(
+    image_paths: PathLike | Iterable[PathLike],
+    markers: dict[str, ImageLike] | None = None,
+    marker_dir: PathLike | None = None,
+    params: DetectionParameters | None = None,
+    converter_params: (
+        ConverterParameters | dict[str, ConverterParameters] | None
+    ) = None,
+    max_workers: int | None = None,
+) -> Iterator[ImageDetections]:
+    """
+    Detect markers on many plot images in a process pool.
+    Images are decoded in the main process and passed to workers through shared memory,
+     results are yielded in order of completion.
+
+    :param image_paths: directory with plot images or list of image paths
+    :param markers: marker templates used for all images (marker label -> template image)
+    :param marker_dir: directory with marker templates of each image (see `load_marker_templates`),
+        used if markers are not specified
+    :param params: matching and detection parameters (defaults if not specified)
+    :param converter_params: converter parameters for all images
+        or for each image (image file name -> parameters)
+    :param max_workers: number of worker processes (number of CPUs if not specified)
+    """
+    if markers is None and marker_dir is None:
+        raise ValueError("Either `markers` or `marker_dir` must be specified")
+    if isinstance(image_paths, (str, pathlib.Path)):
+        image_paths = find_plot_images(image_paths)
+    params = params or DetectionParameters()
+    max_workers = max_workers or multiprocessing.cpu_count()
+
+    # spawned workers do not inherit numba threading layer state of the main process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        # future -> (image path, shared memory with image)
+        in_flight: dict[Future, Tuple[str, SharedMemory]] = dict()
+        try:
+            for image_path in image_paths:
+                # limit number of decoded images waiting in shared memory
+                if len(in_flight) >= 2 * max_workers:
+                    yield from _collect_completed(in_flight)
+
+                image_path = str(image_path)
+                try:
+                    image = load_image(image_path)
+                    image_markers = (
+                        markers
+                        if markers is not None
+                        else load_marker_templates(marker_dir, image_path)
+                    )
+                    if not image_markers:
+                        raise FileNotFoundError(
+                            f"No marker templates for image {image_path}"
+                        )
+                except Exception as ex:
+                    logger.error(f"Failed to load {image_path}: {ex}")
+                    yield ImageDetections(image_path, dict(), dict(), error=repr(ex))
+                    continue
+
+                shared_memory, shared_image = _to_shared_memory(image)
+                future = executor.submit(
+                    _process_image,
+                    image_path,
+                    shared_image,
+                    image_markers,
+                    params,
+                    _image_converter_params(converter_params, image_path),
+                )
+                in_flight[future] = (image_path, shared_memory)
+
+            while in_flight:
+                yield from _collect_completed(in_flight)
+        finally:
+            # iteration was stopped or failed: release images of unfinished tasks
+            for future, (_, shared_memory) in in_flight.items():
+                future.cancel()
+                shared_memory.close()
+                shared_memory.unlink()
+
+
+def run_batch(
+    image_paths: PathLike | Iterable[PathLike],
+    markers: dict[str, ImageLike] | None = None,
+    marker_dir: PathLike | None = None,
+    params: DetectionParameters | None = None,
+    converter_params: (
+        ConverterParameters | dict[str, ConverterParameters] | None
+    ) = None,
+    max_workers: int | None = None,
+) -> dict[str, ImageDetections]:
+    """
+    Same as `iter_batch`, but returns all results: image path -> detections
+    """
+    results = iter_batch(
+        image_paths, markers, marker_dir, params, converter_params, max_workers
+    )
+    return {result.image_path: result for result in results}
+
+
+def _image_converter_params(
+    converter_params: ConverterParameters | dict[str, ConverterParameters] | None,
+    image_path: str,
+) -> ConverterParameters | None:
+    if isinstance(converter_params, dict):
+        return converter_params.get(pathlib.Path(image_path).name)
+    return converter_params
+
+
+def _to_shared_memory(image: ImageLike) -> Tuple[SharedMemory, SharedImage]:
+    shared_memory = SharedMemory(create=True, size=max(image.nbytes, 1))
+    np.ndarray(image.shape, dtype=image.dtype, buffer=shared_memory.buf)[...] = image
+    return shared_memory, (shared_memory.name, image.shape, image.dtype.str)
+
+
+def _collect_completed(
+    in_flight: dict[Future, Tuple[str, SharedMemory]]
+) -> Iterator[ImageDetections]:
+    """
+    Wait for at least one task, release shared memory of completed tasks and yield results
+    """
+    done, _ = wait(in_flight.keys(), return_when=FIRST_COMPLETED)
+    for future in done:
+        image_path, shared_memory = in_flight.pop(future)
+        shared_memory.close()
+        shared_memory.unlink()
+        # errors of matching are caught in worker, so these are failures of the pool itself
+        #  (e.g. worker process was killed or task could not be pickled)
+        try:
+            result = future.result()
+        except Exception as ex:
+            logger.error(f"Failed to process {image_path}: {ex}")
+            result = ImageDetections(image_path, dict(), dict(), error=repr(ex))
+        yield result
+
+
+def _process_image(
+    image_path: str,
+    shared_image: SharedImage,
+    markers: dict[str, ImageLike],
+    params: DetectionParameters,
+    converter_params: ConverterParameters | None,
+) -> ImageDetections:
+    """
+    Worker function: run matching and detection on image from shared memory
+    """
+    name, shape, dtype = shared_image
+    shared_memory = SharedMemory(name=name)
+    try:
+        image = np.ndarray(shape, dtype=dtype, buffer=shared_memory.buf).copy()
+    finally:
+        shared_memory.close()
+
+    try:
+        detections, scores = _detect_markers(image, markers, params)
+        factual_detections = None
+        if converter_params is not None:
+            converter = CoordinatesConverter(converter_params)
+            factual_detections = converter.detections_from_pixel(detections)
+    except Exception as ex:
+        logger.error(f"Failed to process {image_path}: {ex}")
+        return ImageDetections(image_path, dict(), dict(), error=repr(ex))
+
+    return ImageDetections(image_path, detections, scores, factual_detections)
+
+
+def _detect_markers(
+    image: ImageLike, markers: dict[str, ImageLike], params: DetectionParameters
+) -> Tuple[dict[str, ArrayNx2], dict[str, ArrayN]]:
+    plot = Plot(image)
+    plot.markers = {label: np.copy(template) for label, template in markers.items()}
+    plot._init_roi()
+    plot.apply_roi([])
+    plot.run_matching(
+        mode=params.mode,
+        color_delta=params.color_delta,
+        shape_factor=params.shape_factor,
+        pyramid_levels=params.pyramid_levels,
+        backend=params.backend,
+        method_name=params.method_name,
+    )
+
+    detections, scores = dict(), dict()
+    for marker_label in plot.markers.keys():
+        detector = Detector(plot, marker_label)
+        detector.points_num = params.points_num
+        detector.points_density = params.points_density
+        points = detector.detect_points()
+
+        # detected points are bbox centers, scores are taken at bbox top left corners
+        top_left = np.round(
+            points
+            - [(detector.template_width - 1) / 2, (detector.template_height - 1) / 2]
+        )
+        top_left = top_left.astype(np.int64)
+        detections[marker_label] = points
+        scores[marker_label] = detector.correlation_map[top_left[:, 1], top_left[:, 0]]
+
+    return detections, scores
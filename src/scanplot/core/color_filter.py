@@ -1,27 +1,189 @@
+import hashlib
 import logging
-from typing import Tuple
+from collections import OrderedDict
+from typing import Hashable, Tuple
 
 import cv2 as cv
 import numpy as np
 import skimage
+from numba import njit, prange
 
 from scanplot.types import ArrayNx3, ArrayNxM, ImageLike
 
 logger = logging.getLogger(__name__)
 
 
-def get_dominant_marker_colors(marker_image: ImageLike, n_colors: int = 3) -> ArrayNx3:
+# number of bits per channel used in color histogram
+HISTOGRAM_BITS = 5
+
+DOMINANT_COLORS_CACHE_SIZE = 256
+_dominant_colors_cache: OrderedDict[Hashable, ArrayNx3] = OrderedDict()
+
+
+def get_dominant_marker_colors(
+    marker_image: ImageLike,
+    n_colors: int = 3,
+    mask: ArrayNxM | None = None,
+    max_pixels: int | None = None,
+    random_state: int = 0,
+) -> ArrayNx3:
     """
     Compute average values of dominant colors on image.
+    Pixels are clustered with weighted k-means over color histogram,
+     so the result is deterministic for given random_state.
+    Results are memoized by image content.
 
     :param n_colors: number of colors that you want to extract from image
+    :param mask: if specified, only pixels with nonzero mask values are used
+    :param max_pixels: if specified, random subsample of pixels is used
+    :param random_state: seed for pixel subsampling and k-means initialization
     :return: array of pixels, e.g. [[1, 2, 3], [4, 5, 6]]
     """
-    label_map = k_means(marker_image, n_clusters=n_colors)
-    image_mean_colors = average_image_colors(marker_image, label_map)
-    dominant_marker_colors = unique_image_pixels(image_mean_colors)
+    key = _dominant_colors_key(marker_image, n_colors, mask, max_pixels, random_state)
+    if key in _dominant_colors_cache:
+        _dominant_colors_cache.move_to_end(key)
+        return _dominant_colors_cache[key].copy()
+
+    pixels = marker_image.reshape(-1, 3)
+    if mask is not None:
+        pixels = pixels[mask.reshape(-1) != 0]
+    if len(pixels) == 0:
+        raise ValueError("There are no pixels to extract colors from")
+
+    rng = np.random.default_rng(random_state)
+    if max_pixels is not None and len(pixels) > max_pixels:
+        pixels = pixels[rng.choice(len(pixels), size=max_pixels, replace=False)]
+
+    bin_colors, bin_weights = color_histogram(pixels)
+    labels = weighted_k_means(bin_colors, bin_weights, n_colors, rng)
+
+    # average color of pixels in each cluster
+    cluster_weights = np.bincount(labels, weights=bin_weights, minlength=n_colors)
+    cluster_sums = np.stack(
+        [
+            np.bincount(
+                labels, weights=bin_colors[:, c] * bin_weights, minlength=n_colors
+            )
+            for c in range(3)
+        ],
+        axis=1,
+    )
+    is_not_empty = cluster_weights > 0
+    dominant_marker_colors = np.unique(
+        cluster_sums[is_not_empty] / cluster_weights[is_not_empty, np.newaxis], axis=0
+    )
 
-    return dominant_marker_colors
+    _dominant_colors_cache[key] = dominant_marker_colors
+    while len(_dominant_colors_cache) > DOMINANT_COLORS_CACHE_SIZE:
+        _dominant_colors_cache.popitem(last=False)
+
+    return dominant_marker_colors.copy()
+
+
+def color_histogram(pixels: ArrayNx3) -> Tuple[ArrayNx3, np.ndarray]:
+    """
+    Group pixels into histogram bins (HISTOGRAM_BITS per channel).
+
+    :param pixels: array of uint8 pixels
+    :return: average color of pixels in each non empty bin, number of pixels in each bin
+    """
+    pixels = pixels.astype(np.int64)
+    shift = 8 - HISTOGRAM_BITS
+    bins = (
+        ((pixels[:, 0] >> shift) << (2 * HISTOGRAM_BITS))
+        | ((pixels[:, 1] >> shift) << HISTOGRAM_BITS)
+        | (pixels[:, 2] >> shift)
+    )
+    n_bins = 2 ** (3 * HISTOGRAM_BITS)
+
+    bin_weights = np.bincount(bins, minlength=n_bins).astype(np.float64)
+    bin_sums = np.stack(
+        [np.bincount(bins, weights=pixels[:, c], minlength=n_bins) for c in range(3)],
+        axis=1,
+    )
+
+    is_not_empty = bin_weights > 0
+    bin_colors = bin_sums[is_not_empty] / bin_weights[is_not_empty, np.newaxis]
+    return bin_colors, bin_weights[is_not_empty]
+
+
+def weighted_k_means(
+    points: np.ndarray,
+    weights: np.ndarray,
+    n_clusters: int,
+    rng: np.random.Generator,
+    n_attempts: int = 10,
+    max_iterations: int = 50,
+) -> np.ndarray:
+    """
+    Lloyd's k-means with weighted points and k-means++ initialization.
+    Best of n_attempts runs (with the least weighted sum of squared distances) is returned.
+
+    :return: cluster label of each point
+    """
+    n_clusters = min(n_clusters, len(points))
+
+    best_labels, best_inertia = None, np.inf
+    for _ in range(n_attempts):
+        # k-means++ initialization
+        centers = [points[rng.choice(len(points), p=weights / weights.sum())]]
+        for _ in range(1, n_clusters):
+            distances = np.min(
+                ((points[:, np.newaxis] - np.array(centers)) ** 2).sum(axis=2), axis=1
+            )
+            probabilities = weights * distances
+            if probabilities.sum() == 0:
+                break
+            centers.append(
+                points[rng.choice(len(points), p=probabilities / probabilities.sum())]
+            )
+        centers = np.array(centers)
+
+        labels = np.zeros(len(points), dtype=np.int64)
+        for iteration in range(max_iterations):
+            distances = ((points[:, np.newaxis] - centers) ** 2).sum(axis=2)
+            new_labels = np.argmin(distances, axis=1)
+            if iteration > 0 and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+
+            cluster_weights = np.bincount(
+                labels, weights=weights, minlength=len(centers)
+            )
+            is_not_empty = cluster_weights > 0
+            for c in range(points.shape[1]):
+                cluster_sums = np.bincount(
+                    labels, weights=weights * points[:, c], minlength=len(centers)
+                )
+                centers[is_not_empty, c] = (
+                    cluster_sums[is_not_empty] / cluster_weights[is_not_empty]
+                )
+
+        inertia = np.sum(weights * ((points - centers[labels]) ** 2).sum(axis=1))
+        if inertia < best_inertia:
+            best_labels, best_inertia = labels, inertia
+
+    return best_labels
+
+
+def _dominant_colors_key(
+    image: ImageLike,
+    n_colors: int,
+    mask: ArrayNxM | None,
+    max_pixels: int | None,
+    random_state: int,
+) -> Hashable:
+    content_hash = hashlib.blake2b(np.ascontiguousarray(image).data, digest_size=16)
+    if mask is not None:
+        content_hash.update(np.ascontiguousarray(mask != 0).data)
+    return (
+        content_hash.hexdigest(),
+        image.shape,
+        image.dtype.str,
+        n_colors,
+        max_pixels,
+        random_state,
+    )
 
 
 def filter_by_colors(
@@ -32,17 +194,157 @@ def filter_by_colors(
     """
     Perform image filrtation by given set of colors and given precision.
     """
-    lower_bound_pixels, upper_bound_pixels = filtering_bounds(
-        pixels=colors,
-        color_delta=color_delta,
+    distance_map = color_distance_map(image, colors)
+    image_filtered = filter_by_color_distance(image, distance_map, color_delta)
+
+    return image_filtered
+
+
+def color_distance_map(image: ImageLike, colors: ArrayNx3) -> ArrayNxM:
+    """
+    Compute Chebyshev distance from every image pixel to the nearest of given colors:
+     min over colors of max(|b - b_color|, |g - g_color|, |r - r_color|).
+    Pixel lies within `filtering_bounds` of colors if its distance <= color_delta,
+     so image can be filtered with any color_delta using single comparison.
+
+    :return: 2D array (uint8)
+    """
+    return color_distance_maps(image, [colors])[0]
+
+
+def color_distance_maps(image: ImageLike, color_sets: list[ArrayNx3]) -> np.ndarray:
+    """
+    Compute `color_distance_map` for several sets of colors (e.g. for several markers)
+     in a single pass over image pixels.
+
+    :param color_sets: list of color arrays, e.g. dominant colors of each marker
+    :return: array (uint8) with shape (number of color sets, image height, image width)
+    """
+    image_height, image_width = image.shape[0], image.shape[1]
+    image = np.ascontiguousarray(image, dtype=np.uint8).reshape(
+        image_height, image_width, -1
     )
-    mask = get_filtering_mask(
-        image,
-        lower_bound_pixels,
-        upper_bound_pixels,
+
+    color_sets = [np.asarray(c).reshape(-1, image.shape[2]) for c in color_sets]
+    # same rounding of colors as in filtering_bounds
+    colors = np.clip(np.concatenate(color_sets).astype(np.int64), 0, 255)
+    color_set_indexes = np.repeat(
+        np.arange(len(color_sets), dtype=np.int64), [len(c) for c in color_sets]
     )
 
-    image_filtered = apply_image_mask(image, mask)
+    return _color_distance_kernel(image, colors, color_set_indexes, len(color_sets))
+
+
+@njit(parallel=True, cache=True)
+def _color_distance_kernel(image, colors, color_set_indexes, n_color_sets):
+    """
+    Rows of the image are processed in parallel.
+    Distances are recomputed only when pixel differs from the previous pixel in a row
+     (plot images mostly consist of long runs of background pixels).
+    """
+    image_height, image_width, n_channels = image.shape
+    distance_maps = np.empty((n_color_sets, image_height, image_width), dtype=np.uint8)
+
+    for y in prange(image_height):
+        pixel_distances = np.empty(n_color_sets, dtype=np.uint8)
+        for x in range(image_width):
+            is_same_pixel = x > 0
+            if is_same_pixel:
+                for c in range(n_channels):
+                    if image[y, x, c] != image[y, x - 1, c]:
+                        is_same_pixel = False
+                        break
+
+            if not is_same_pixel:
+                pixel_distances[:] = 255
+                for k in range(colors.shape[0]):
+                    distance = 0
+                    for c in range(n_channels):
+                        distance = max(
+                            distance, abs(np.int64(image[y, x, c]) - colors[k, c])
+                        )
+                    set_index = color_set_indexes[k]
+                    if distance < pixel_distances[set_index]:
+                        pixel_distances[set_index] = distance
+
+            for set_index in range(n_color_sets):
+                distance_maps[set_index, y, x] = pixel_distances[set_index]
+
+    return distance_maps
+
+
+def color_bitmask(
+    distance_maps: np.ndarray | list[ArrayNxM], color_delta: int
+) -> ArrayNxM:
+    """
+    Classify image pixels by several sets of colors:
+     bit k of the result is set if pixel lies within color_delta of k-th color set.
+
+    :param distance_maps: result of `color_distance_maps` (or list of distance maps)
+    :return: 2D array (uint8, uint16, uint32 or uint64 depending on number of color sets)
+    """
+    if not 0 <= color_delta <= 255:
+        raise ValueError("Param color_delta must be in range [0, 255]")
+
+    n_color_sets = len(distance_maps)
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if n_color_sets <= np.iinfo(dtype).bits:
+            break
+    else:
+        raise ValueError(f"Too many color sets: {n_color_sets}, maximum is 64")
+
+    bitmask = np.zeros(distance_maps[0].shape, dtype=dtype)
+    for k in range(n_color_sets):
+        bitmask |= (distance_maps[k] <= color_delta).astype(dtype) << dtype(k)
+
+    return bitmask
+
+
+def filter_by_color_bitmask(
+    image: ImageLike,
+    bitmask: ArrayNxM,
+    bit_index: int,
+    color: int = 255,
+) -> ImageLike:
+    """
+    Perform image filtration using `color_bitmask`,
+     pixels that do not match color set with given index are replaced with given color.
+    """
+    bit = bitmask.dtype.type(1) << bitmask.dtype.type(bit_index)
+    restricted_area = ((bitmask & bit) == 0).view(np.uint8) * np.uint8(255)
+    return _replace_restricted_pixels(image, restricted_area, color)
+
+
+def filter_by_color_distance(
+    image: ImageLike,
+    distance_map: ArrayNxM,
+    color_delta: int,
+    color: int = 255,
+) -> ImageLike:
+    """
+    Perform image filtration using precomputed `color_distance_map`,
+     result is the same as in `filter_by_colors`.
+    Pixels with distance greater than color_delta are replaced with given color.
+    """
+    if not 0 <= color_delta <= 255:
+        raise ValueError(f"Param color_delta must be in range (0, 255)")
+
+    _, restricted_area = cv.threshold(distance_map, color_delta, 255, cv.THRESH_BINARY)
+    return _replace_restricted_pixels(image, restricted_area, color)
+
+
+def _replace_restricted_pixels(
+    image: ImageLike, restricted_area: ArrayNxM, color: int
+) -> ImageLike:
+    """
+    :param restricted_area: 2D array (uint8), 255 on restricted pixels and 0 on others
+    """
+    if len(image.shape) == 3:
+        restricted_area = cv.merge([restricted_area] * image.shape[2])
+
+    image_filtered = cv.bitwise_and(image, cv.bitwise_not(restricted_area))
+    if color != 0:
+        image_filtered |= restricted_area & np.uint8(color)
 
     return image_filtered
 
@@ -2,7 +2,7 @@ from enum import Enum
 
 import numpy as np
 
-from scanplot.types import ArrayN, ConverterParameters
+from scanplot.types import ArrayN, ArrayNx2, ConverterParameters
 
 
 class AxisType(Enum):
@@ -11,6 +11,14 @@ class AxisType(Enum):
 
 
 class CoordinatesConverter:
+    """
+    Converts pixel coordinates into real values and back.
+
+    Each axis is precomputed at construction into transform
+     value = slope * pixel + intercept (linear axis)
+     value = 10 ** (slope * pixel + intercept) (logscale axis)
+    """
+
     def __init__(self, params: ConverterParameters):
         self.x_min_px: int = params.x_min_px
         self.x_max_px: int = params.x_max_px
@@ -25,77 +33,113 @@ class CoordinatesConverter:
         self.x_axis_type = AxisType(params.x_axis_type)
         self.y_axis_type = AxisType(params.y_axis_type)
 
-    def from_pixel(
-        self, x_pixel: int | np.ndarray, y_pixel: int | np.ndarray
-    ) -> tuple[float, float] | tuple[np.ndarray, np.ndarray]:
+        assert self.y_min_px > self.y_max_px, "Y pixels coords grow from top to bottom"
 
-        if self.x_axis_type == AxisType.LINEAR:
-            x_factual = self._convert_x_axis_linear(x_pixel)
-        elif self.x_axis_type == AxisType.LOGSCALE:
-            x_factual = self._convert_x_axis_logscale(x_pixel)
+        self._x_slope, self._x_intercept = self._axis_transform(
+            self.x_min_px,
+            self.x_max_px,
+            self.x_min_factual,
+            self.x_max_factual,
+            self.x_axis_type,
+        )
+        self._y_slope, self._y_intercept = self._axis_transform(
+            self.y_min_px,
+            self.y_max_px,
+            self.y_min_factual,
+            self.y_max_factual,
+            self.y_axis_type,
+        )
+
+    @staticmethod
+    def _axis_transform(
+        min_px: int,
+        max_px: int,
+        min_factual: float,
+        max_factual: float,
+        axis_type: AxisType,
+    ) -> tuple[float, float]:
+        """
+        Return slope and intercept of the axis transform (in log10 space for logscale axis)
+        """
+        if axis_type == AxisType.LOGSCALE:
+            min_factual, max_factual = np.log10(min_factual), np.log10(max_factual)
 
-        if self.y_axis_type == AxisType.LINEAR:
-            y_factual = self._convert_y_axis_linear(y_pixel)
-        elif self.y_axis_type == AxisType.LOGSCALE:
-            y_factual = self._convert_y_axis_logscale(y_pixel)
+        slope = (max_factual - min_factual) / (max_px - min_px)
+        intercept = min_factual - slope * min_px
+        return float(slope), float(intercept)
 
+    def from_pixel(
+        self, x_pixel: int | np.ndarray, y_pixel: int | np.ndarray
+    ) -> tuple[float, float] | tuple[np.ndarray, np.ndarray]:
+        """
+        Converts pixel coordinates (numbers or arrays of any shape) into real values
+        """
+        x_factual = self._apply(
+            x_pixel, self._x_slope, self._x_intercept, self.x_axis_type
+        )
+        y_factual = self._apply(
+            y_pixel, self._y_slope, self._y_intercept, self.y_axis_type
+        )
         return x_factual, y_factual
 
-    def _convert_x_axis_linear(self, x_pixel: int) -> float:
+    def to_pixel(
+        self, x_factual: float | np.ndarray, y_factual: float | np.ndarray
+    ) -> tuple[float, float] | tuple[np.ndarray, np.ndarray]:
         """
-        Converts x-axis pixel value into real value
+        Converts real values (numbers or arrays of any shape) into pixel coordinates,
+         inverse of `from_pixel`
         """
-        alpha_x = (self.x_max_factual - self.x_min_factual) / (self.x_max_px - self.x_min_px)  # fmt: skip
-
-        if np.all(x_pixel >= self.x_min_px):
-            x_factual = alpha_x * (x_pixel - self.x_min_px) + self.x_min_factual
-        else:
-            x_factual = self.x_min_factual - alpha_x * (self.x_min_px - x_pixel)
-
-        return x_factual
-
-    def _convert_y_axis_linear(self, y_pixel: int) -> float:
+        x_pixel = self._apply_inverse(
+            x_factual, self._x_slope, self._x_intercept, self.x_axis_type
+        )
+        y_pixel = self._apply_inverse(
+            y_factual, self._y_slope, self._y_intercept, self.y_axis_type
+        )
+        return x_pixel, y_pixel
+
+    def points_from_pixel(self, points: ArrayNx2) -> ArrayNx2:
         """
-        Converts y-axis pixel value into real value
-         (assumed that Y pixels coords grow from top to bottom)
+        Converts array of points (x, y) with shape=(n, 2) into real values
         """
-        assert self.y_min_px > self.y_max_px, "Y pixels coords grow from top to bottom"
-
-        alpha_y = (self.y_max_factual - self.y_min_factual) / (self.y_min_px - self.y_max_px)  # fmt: skip
-
-        if np.all(y_pixel >= self.y_min_px):
-            y_factual = self.y_min_factual + alpha_y * (self.y_min_px - y_pixel)
-        else:
-            y_factual = self.y_min_factual - alpha_y * (y_pixel - self.y_min_px)
-
-        return y_factual
-
-    def _convert_x_axis_logscale(self, x_pixel: int) -> float:
-        log_x_min_factual = np.log10(self.x_min_factual)
-        log_x_max_factual = np.log10(self.x_max_factual)
-
-        alpha_x = (log_x_max_factual - log_x_min_factual) / (self.x_max_px - self.x_min_px)  # fmt: skip
-
-        if np.all(x_pixel >= self.x_min_px):
-            log_x_factual = alpha_x * (x_pixel - self.x_min_px) + log_x_min_factual
-        else:
-            log_x_factual = log_x_min_factual - alpha_x * (self.x_min_px - x_pixel)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        x_factual, y_factual = self.from_pixel(points[:, 0], points[:, 1])
+        return np.stack((x_factual, y_factual), axis=1)
 
-        x_factual = 10**log_x_factual
-        return x_factual
-
-    def _convert_y_axis_logscale(self, y_pixel: int) -> float:
-        log_y_min_factual = np.log10(self.y_min_factual)
-        log_y_max_factual = np.log10(self.y_max_factual)
-
-        assert self.y_min_px > self.y_max_px, "Y pixels coords grow from top to bottom"
-
-        alpha_y = (log_y_max_factual - log_y_min_factual) / (self.y_min_px - self.y_max_px)  # fmt: skip
-
-        if np.all(y_pixel >= self.y_min_px):
-            log_y_factual = log_y_min_factual + alpha_y * (self.y_min_px - y_pixel)
-        else:
-            log_y_factual = log_y_min_factual - alpha_y * (y_pixel - self.y_min_px)
-
-        y_factual = 10**log_y_factual
-        return y_factual
+    def detections_from_pixel(
+        self, detections: dict[str, ArrayNx2]
+    ) -> dict[str, ArrayNx2]:
+        """
+        Converts detected points of all markers
+         (e.g. result of DetectorWidgetCombined.get_detections) in a single pass
+        """
+        labels = list(detections.keys())
+        points = [
+            np.asarray(detections[label], dtype=np.float64).reshape(-1, 2)
+            for label in labels
+        ]
+        if not points:
+            return dict()
+
+        factual_points = self.points_from_pixel(np.concatenate(points))
+        split_indexes = np.cumsum([len(p) for p in points])[:-1]
+        return dict(zip(labels, np.split(factual_points, split_indexes)))
+
+    @staticmethod
+    def _apply(
+        pixel: int | np.ndarray, slope: float, intercept: float, axis_type: AxisType
+    ) -> float | ArrayN:
+        value = np.multiply(pixel, slope, dtype=np.float64)
+        value += intercept
+        if axis_type == AxisType.LOGSCALE:
+            value = np.power(10.0, value, out=value if value.ndim else None)
+        return value if value.ndim else float(value)
+
+    @staticmethod
+    def _apply_inverse(
+        value: float | np.ndarray, slope: float, intercept: float, axis_type: AxisType
+    ) -> float | ArrayN:
+        if axis_type == AxisType.LOGSCALE:
+            value = np.log10(value, dtype=np.float64)
+        pixel = np.subtract(value, intercept, dtype=np.float64)
+        pixel /= slope
+        return pixel if pixel.ndim else float(pixel)
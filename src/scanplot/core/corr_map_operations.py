@@ -1,6 +1,7 @@
 import logging
 from typing import List, Tuple
 
+import cv2 as cv
 import numpy as np
 
 from scanplot.types import ArrayNx2, ArrayNxM, ImageLike
@@ -8,41 +9,87 @@ from scanplot.types import ArrayNx2, ArrayNxM, ImageLike
 logger = logging.getLogger(__name__)
 
 
-def remove_nan_inf(map: ArrayNxM) -> ArrayNxM:
+# floating point type of correlation maps and accumulators
+_COMPUTE_DTYPE = np.dtype(np.float32)
+
+
+def get_compute_dtype() -> np.dtype:
+    return _COMPUTE_DTYPE
+
+
+def set_compute_dtype(dtype: type | np.dtype) -> None:
+    """
+    Set floating point type of correlation maps and accumulators (np.float32 or np.float64)
+    """
+    global _COMPUTE_DTYPE
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError("Compute dtype must be either float32 or float64")
+    _COMPUTE_DTYPE = dtype
+
+
+def as_compute_dtype(map: ArrayNxM) -> ArrayNxM:
+    """
+    Convert map to compute dtype (without copy if map already has compute dtype)
+    """
+    return map.astype(_COMPUTE_DTYPE, copy=False)
+
+
+def remove_nan_inf(map: ArrayNxM, inplace: bool = False) -> ArrayNxM:
     """
     Replace all NaN and Inf values with zero values
 
     :param map: 2d array
+    :param inplace: modify given map instead of creating a new one
     """
-    map2 = np.copy(map)
-    nan_indexes = np.where(np.isnan(map))
-    inf_indexes = np.where(np.isinf(map))
-    logger.debug(f"Number of NaN values: {len(nan_indexes[0])}")
-    logger.debug(f"Number of inf values: {len(inf_indexes[0])}")
-    map2[nan_indexes] = 0
-    map2[inf_indexes] = 0
-    return map2
+    logger.debug(f"Number of NaN values: {np.count_nonzero(np.isnan(map))}")
+    logger.debug(f"Number of inf values: {np.count_nonzero(np.isinf(map))}")
+    return np.nan_to_num(map, copy=not inplace, nan=0, posinf=0, neginf=0)
 
 
-def invert_correlation_map(correlation_map: ArrayNxM) -> ArrayNxM:
+def invert_correlation_map(
+    correlation_map: ArrayNxM, inplace: bool = False
+) -> ArrayNxM:
     """
     Invert 2D array with float values
+
+    :param inplace: modify given map instead of creating a new one
     """
-    inverted_correlation_map = (-correlation_map) + np.nanmax(correlation_map)
-    return inverted_correlation_map
+    max_value = np.nanmax(correlation_map)
+    if inplace:
+        return np.subtract(max_value, correlation_map, out=correlation_map)
+    return max_value - correlation_map
+
 
+def normalize_map(map: ArrayNxM, inplace: bool = False) -> ArrayNxM:
+    """
+    Divide map by its maximum
 
-def normalize_map(map: ArrayNxM) -> ArrayNxM:
+    :param inplace: modify given map (must have float dtype) instead of creating a new one
+    """
+    if inplace:
+        return np.divide(map, np.nanmax(map), out=map)
     return map / np.nanmax(map)
 
 
 def get_corr_map_maximums(
-    correlation_map: ArrayNxM, treshold: float
+    correlation_map: ArrayNxM,
+    treshold: float,
+    neighbourhood_size: int | Tuple[int, int] | None = None,
 ) -> Tuple[ArrayNx2, int]:
     """
     Return coordinades of points on 2D correlation map,
      which have value greater than given treshold
+
+    :param neighbourhood_size: if specified, only local maxima in neighbourhood
+        of given size (e.g. template size) are returned, see `local_maxima`
     """
+    if neighbourhood_size is not None:
+        points, _ = local_maxima(
+            correlation_map, treshold, neighbourhood_size, merge_plateaus=True
+        )
+        return points, len(points)
+
     maximums = np.where(correlation_map >= treshold)
     y_points, x_points = maximums
     points = np.stack((x_points, y_points)).T
@@ -51,17 +98,107 @@ def get_corr_map_maximums(
     return points, number_of_maximums
 
 
+def local_maxima(
+    correlation_map: ArrayNxM,
+    treshold: float,
+    neighbourhood_size: int | Tuple[int, int] = 3,
+    merge_plateaus: bool = False,
+    top_k: int | None = None,
+) -> Tuple[ArrayNx2, np.ndarray]:
+    """
+    Return coordinates and values of local maxima of 2D correlation map
+     (values not less than any value in the neighbourhood), which are greater than given treshold.
+    NaN and inf values are ignored.
+
+    :param neighbourhood_size: size of neighbourhood (height, width), e.g. template size,
+        by default maxima are compared with 8 neighbours
+    :param merge_plateaus: keep single point (closest to plateau center)
+        for each connected area of equal maxima
+    :param top_k: if specified, only top_k maxima with the greatest values are returned
+        (in descending order of values)
+    :return: points (x, y) with shape=(n, 2), values with shape=(n,)
+    """
+    if isinstance(neighbourhood_size, int):
+        neighbourhood_size = (neighbourhood_size, neighbourhood_size)
+
+    correlation_map = as_compute_dtype(correlation_map)
+    # map is copied only if there are values to replace
+    is_finite = np.isfinite(correlation_map)
+    if not np.all(is_finite):
+        correlation_map = np.where(is_finite, correlation_map, -np.inf)
+    neighbourhood_maximum = cv.dilate(
+        correlation_map, np.ones(neighbourhood_size, dtype=np.uint8)
+    )
+
+    is_maximum = (correlation_map >= neighbourhood_maximum) & (
+        correlation_map >= treshold
+    )
+    is_maximum &= correlation_map > -np.inf
+    y_points, x_points = np.nonzero(is_maximum)
+
+    if merge_plateaus and len(y_points) > 0:
+        # neighbouring maxima always have equal values, so connected components are plateaus
+        _, labels, _, centroids = cv.connectedComponentsWithStats(
+            is_maximum.view(np.uint8), connectivity=8
+        )
+        point_labels = labels[y_points, x_points]
+        centroid_distances = (x_points - centroids[point_labels, 0]) ** 2 + (
+            y_points - centroids[point_labels, 1]
+        ) ** 2
+        order = np.lexsort((centroid_distances, point_labels))
+        _, first_indexes = np.unique(point_labels[order], return_index=True)
+        keep = np.sort(order[first_indexes])
+        y_points, x_points = y_points[keep], x_points[keep]
+
+    values = correlation_map[y_points, x_points]
+
+    if top_k is not None:
+        top_indexes = _top_k_indexes(values, top_k)
+        y_points, x_points, values = (
+            y_points[top_indexes],
+            x_points[top_indexes],
+            values[top_indexes],
+        )
+
+    points = np.stack((x_points, y_points)).T
+    return points, values
+
+
 def get_first_N_maximums(
-    corr_map: ArrayNxM, N: int
+    corr_map: ArrayNxM,
+    N: int,
+    neighbourhood_size: int | Tuple[int, int] | None = None,
 ) -> List[Tuple[float, Tuple[int, int]]]:
     """
     Return first N max elements values and indices in 2d map
 
     :param corr_map: 2d array (correlation map or accumulator array)
     :param N: number of maximums
-    :return: list of elements (max_value, (max_index_y, max_index_x))
+    :param neighbourhood_size: if specified, only local maxima in neighbourhood
+        of given size are considered (single element for each peak), see `local_maxima`
+    :return: list of elements (max_value, (max_index_y, max_index_x)) in ascending order of values
     """
-    indices = corr_map.ravel().argsort()[-N:]
-    indices = (np.unravel_index(i, corr_map.shape) for i in indices)
+    if neighbourhood_size is None:
+        flat_indices = _top_k_indexes(corr_map.ravel(), N)[::-1]
+        indices = (np.unravel_index(i, corr_map.shape) for i in flat_indices)
+    else:
+        points, _ = local_maxima(
+            corr_map, -np.inf, neighbourhood_size, merge_plateaus=True, top_k=N
+        )
+        indices = ((y, x) for x, y in points[::-1])
 
     return [(corr_map[i], i) for i in indices]
+
+
+def _top_k_indexes(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Return indexes of k greatest values in descending order of values
+     (NaN values are considered as the greatest, as in np.argsort)
+    """
+    k = min(k, len(values))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    top_indexes = np.argpartition(values, len(values) - k)[len(values) - k :]
+    order = np.argsort(values[top_indexes], kind="stable")[::-1]
+    return top_indexes[order]
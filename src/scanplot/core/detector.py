@@ -2,10 +2,13 @@ import numpy as np
 
 from scanplot.types import ArrayNx2, ArrayNxM, ImageLike
 
-from .corr_map_operations import get_corr_map_maximums
-from .nms import apply_nms
+from .nms import NMSIndex
+from .peak_index import PeakIndex
 from .scanplot_api import Plot
 
+# correlation map treshold for points_num = 100
+MIN_CORR_MAP_TRESHOLD = 0.15
+
 
 class Detector:
     def __init__(
@@ -20,10 +23,12 @@ class Detector:
         self.points_num: float = 30
         self.points_density: float = 30
 
+        self._peak_index: PeakIndex | None = None
+        self._nms_index: NMSIndex | None = None
+
     @property
     def corr_map_treshold(self) -> float:
-        min_corr_map_treshold = 0.15  # from 0 to 1
-        a = (min_corr_map_treshold - 1) / 100
+        a = (MIN_CORR_MAP_TRESHOLD - 1) / 100
         b = 1
         return self.linear_parameter_transform(self.points_num, a=a, b=b)
 
@@ -39,20 +44,38 @@ class Detector:
     def template_width(self) -> int:
         return self.template.shape[1]
 
+    @property
+    def peak_index(self) -> PeakIndex:
+        """
+        Local maxima of correlation map, built once and reused for any points_num
+         (rebuilt only if treshold is less than minimal treshold of the index)
+        """
+        treshold = self.corr_map_treshold
+        if self._peak_index is None or treshold < self._peak_index.min_treshold:
+            self._peak_index = PeakIndex(
+                self.correlation_map, min_treshold=min(treshold, MIN_CORR_MAP_TRESHOLD)
+            )
+            self._nms_index = None
+        return self._peak_index
+
+    @property
+    def nms_index(self) -> NMSIndex:
+        """
+        NMS of all peaks of peak index, precomputed for any points_num and points_density
+        """
+        peak_index = self.peak_index
+        if self._nms_index is None:
+            self._nms_index = NMSIndex(
+                peak_index.points, self.template_width, self.template_height
+            )
+        return self._nms_index
+
     def detect_points(self) -> ArrayNx2:
-        ## get max points
-        max_points, _ = get_corr_map_maximums(
-            correlation_map=self.correlation_map, treshold=self.corr_map_treshold
-        )
+        ## number of max points
+        n_points = self.peak_index.count(self.corr_map_treshold)
 
         ## NMS
-        detected_points = apply_nms(
-            points=max_points,
-            correlation_map=self.correlation_map,
-            iou_treshold=self.iou_treshold,
-            bbox_width=self.template_width,
-            bbox_height=self.template_height,
-        )
+        detected_points = self.nms_index.detect(n_points, self.iou_treshold)
 
         return detected_points
 
@@ -0,0 +1,102 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Tuple
+
+import numpy as np
+
+from scanplot.types import ArrayN, ImageLike
+
+logger = logging.getLogger(__name__)
+
+
+class ImageFeatures(NamedTuple):
+    """
+    Features of the image used in Hough voting
+
+    :param shape: image shape (height, width)
+    :param edge_i: row indexes of edge pixels (int32, sorted by rows)
+    :param edge_j: column indexes of edge pixels (int32)
+    :param edge_bins: quantized gradient orientation of edge pixels (int16)
+    """
+
+    shape: Tuple[int, int]
+    edge_i: ArrayN
+    edge_j: ArrayN
+    edge_bins: ArrayN
+
+    @property
+    def nbytes(self) -> int:
+        return self.edge_i.nbytes + self.edge_j.nbytes + self.edge_bins.nbytes
+
+
+class ImageFeatureCache:
+    """
+    LRU cache of image features used in Hough voting: edge pixels and their gradient bins.
+    Cache key is a content hash of the image plus feature parameters,
+     so features are shared between markers that are matched on the same image.
+    Total size of cached features is bounded by `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        if max_bytes < 1:
+            raise ValueError("Param max_bytes must be positive")
+        self.max_bytes = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self._features: OrderedDict[Hashable, ImageFeatures] = OrderedDict()
+        self._nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._features)
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def get(self, key: Hashable) -> ImageFeatures | None:
+        """
+        :param key: cache key of the image, see `key`
+        """
+        features = self._features.get(key)
+
+        if features is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._features.move_to_end(key)
+        logger.debug("Image features are taken from cache")
+        return features
+
+    def put(self, key: Hashable, features: ImageFeatures) -> None:
+        """
+        :param key: cache key of the image, see `key`
+        """
+        if features.nbytes > self.max_bytes:
+            return
+
+        # cached arrays are shared between callers, so protect them from changes
+        for feature in (features.edge_i, features.edge_j, features.edge_bins):
+            feature.setflags(write=False)
+
+        if key in self._features:
+            self._nbytes -= self._features.pop(key).nbytes
+        self._features[key] = features
+        self._nbytes += features.nbytes
+
+        while self._nbytes > self.max_bytes:
+            _, evicted = self._features.popitem(last=False)
+            self._nbytes -= evicted.nbytes
+
+    def clear(self) -> None:
+        self._features.clear()
+        self._nbytes = 0
+
+    @staticmethod
+    def key(image: ImageLike, *params: Hashable) -> Hashable:
+        """
+        Cache key: content hash of the image and parameters of features computation
+        """
+        image_hash = hashlib.blake2b(np.ascontiguousarray(image).data, digest_size=16)
+        return (image_hash.hexdigest(), image.shape, image.dtype.str, *params)
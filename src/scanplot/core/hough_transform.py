@@ -1,28 +1,97 @@
 import logging
-from collections import defaultdict
-from typing import List, Tuple
+from typing import List, Literal, NamedTuple, Tuple
 
 import cv2 as cv
+import numba
 import numpy as np
+from numba import njit, prange
 from scipy.ndimage import sobel
 
-from .corr_map_operations import normalize_map
+from .corr_map_operations import get_compute_dtype, normalize_map
+from .feature_cache import ImageFeatureCache, ImageFeatures
 from .process_template import crop_image
+from .r_table import RTable, quantize_angles
 
 logger = logging.getLogger(__name__)
 
+# upper bound for the number of votes scattered into accumulator at once
+VOTES_CHUNK_SIZE = 2**20
+
+# bbox (x_min, x_max, y_min, y_max), borders included
+Window = Tuple[int, int, int, int]
+
 
 def generalized_hough_transform(
     image: np.ndarray,
-    template: np.ndarray,
+    template: np.ndarray | List[np.ndarray],
     norm_result: bool = True,
     crop_result: bool = True,
-) -> np.ndarray:
-    hough_model = build_hough_model(template)
-    accumulator = fill_accumulator(hough_model, image)
+    backend: Literal["vectorized", "parallel", "reference"] = "vectorized",
+    feature_cache: ImageFeatureCache | None = None,
+    n_workers: int | None = None,
+) -> np.ndarray | List[np.ndarray]:
+    """
+    Compute Hough accumulator of the template on the image.
+    If list of templates is given, image edge pixels are scanned once
+     for all templates and list of accumulators is returned.
+
+    Votes are counted only inside the returned (cropped) region,
+     so memory usage is about one output map per template.
+
+    :param backend: voting engine, see `fill_accumulator`
+    :param n_workers: number of threads for backend='parallel' (by default all cores)
+    """
+    is_multi = isinstance(template, (list, tuple))
+    templates = list(template) if is_multi else [template]
+    hough_models = [build_hough_model(t) for t in templates]
+
+    if backend == "reference":
+        accumulators = [
+            _postprocess_accumulator(
+                fill_accumulator(
+                    m, image, backend=backend, feature_cache=feature_cache
+                ),
+                t,
+                norm_result,
+                crop_result,
+            )
+            for m, t in zip(hough_models, templates)
+        ]
+        return accumulators if is_multi else accumulators[0]
+
+    image_shape = image.shape[0], image.shape[1]
+    windows = [
+        accumulator_window(image_shape, t.shape[1], t.shape[0]) if crop_result else None
+        for t in templates
+    ]
+    accumulators, maximums = fill_accumulators(
+        hough_models,
+        image,
+        feature_cache=feature_cache,
+        parallel=backend == "parallel",
+        n_workers=n_workers,
+        windows=windows,
+    )
 
+    dtype = get_compute_dtype()
+    for k in range(len(accumulators)):
+        if norm_result:
+            # normalize by maximum of the whole (uncropped) accumulator
+            accumulators[k] = np.divide(accumulators[k], maximums[k], dtype=dtype)
+        else:
+            accumulators[k] = accumulators[k].astype(dtype)
+
+    return accumulators if is_multi else accumulators[0]
+
+
+def _postprocess_accumulator(
+    accumulator: np.ndarray,
+    template: np.ndarray,
+    norm_result: bool,
+    crop_result: bool,
+) -> np.ndarray:
     if norm_result:
-        accumulator = normalize_map(accumulator)
+        accumulator = normalize_map(accumulator, inplace=True)
 
     if crop_result:
         template_heihgt, template_width = template.shape[0], template.shape[1]
@@ -34,20 +103,32 @@ def generalized_hough_transform(
 def crop_accumulator(
     accumulator: np.ndarray, template_width: int, template_heihgt: int
 ) -> np.ndarray:
+    bbox = accumulator_window(accumulator.shape, template_width, template_heihgt)
+    accumulator_cropped = crop_image(accumulator, bbox=bbox)
+    return accumulator_cropped
+
+
+def accumulator_window(
+    accumulator_shape: Tuple[int, int], template_width: int, template_heihgt: int
+) -> Window:
+    """
+    Return region of accumulator that corresponds to template matching correlation map
+
+    :return: bbox (x_min, x_max, y_min, y_max)
+    """
     x_min = template_width // 2
     y_min = template_heihgt // 2
     if template_width % 2 == 0:
-        x_max = accumulator.shape[1] - template_width // 2
+        x_max = accumulator_shape[1] - template_width // 2
     else:
-        x_max = accumulator.shape[1] - template_width // 2 - 1
+        x_max = accumulator_shape[1] - template_width // 2 - 1
 
     if template_heihgt % 2 == 0:
-        y_max = accumulator.shape[0] - template_heihgt // 2
+        y_max = accumulator_shape[0] - template_heihgt // 2
     else:
-        y_max = accumulator.shape[0] - template_heihgt // 2 - 1
+        y_max = accumulator_shape[0] - template_heihgt // 2 - 1
 
-    accumulator_cropped = crop_image(accumulator, bbox=(x_min, x_max, y_min, y_max))
-    return accumulator_cropped
+    return x_min, x_max, y_min, y_max
 
 
 def calc_gradients_v0(image: np.ndarray) -> np.ndarray:
@@ -87,7 +168,9 @@ def build_hough_model(
     min_canny_treshold: int = 10,
     max_canny_treshold: int = 180,
     reference_point: Tuple[int, int] = None,
-) -> defaultdict:
+    n_bins: int = 360,
+    max_points: int | None = None,
+) -> RTable:
     """
     Build the Hough model (R-table) from the given shape image and a reference point
 
@@ -95,6 +178,9 @@ def build_hough_model(
     :param min_canny_treshold: threshold1 in cv.Canny
     :param max_canny_treshold: threshold2 in cv.Canny
     :param origin: reference point (by default center of a template)
+    :param n_bins: number of bins for gradient orientation quantization
+    :param max_points: max number of template edge points stored in R-table
+        (useful for large templates), by default all edge points are used
     :return: Hough model of the template
     """
     # get reference_point if it is not specified
@@ -108,29 +194,84 @@ def build_hough_model(
     gradient = calc_gradients(edges)
 
     # build Hough model
-    hough_model = defaultdict(list)
-    for (i, j), value in np.ndenumerate(edges):
-        if value:
-            hough_model[gradient[i, j]].append((reference_point[0] - i, reference_point[1] - j))  # fmt: skip
+    hough_model = RTable.from_edges(
+        edges,
+        gradient,
+        reference_point=reference_point,
+        n_bins=n_bins,
+        max_points=max_points,
+    )
 
     return hough_model
 
 
 def fill_accumulator(
-    hough_model: defaultdict,
+    hough_model: RTable,
     source_image: np.ndarray,
     min_canny_treshold: int = 10,
     max_canny_treshold: int = 50,
+    backend: Literal["vectorized", "parallel", "reference"] = "vectorized",
+    bin_tolerance: int = 0,
+    feature_cache: ImageFeatureCache | None = None,
+    n_workers: int | None = None,
 ) -> np.ndarray:
     """
     Perform a General Hough Transform with the given image and R-table (Hough model).
 
-    :param r_table: Hough model of the template
+    :param hough_model: Hough model of the template
     :param source_image: source image where we try to find template (polt image, can be RGB or single channel)
     :param min_canny_treshold: threshold1 in cv.Canny
     :param max_canny_treshold: threshold2 in cv.Canny
+    :param backend: voting engine, one of {'vectorized', 'parallel', 'reference'}
+        'vectorized' - bulk scatter-add of all votes (default)
+        'parallel' - multithreaded voting, image is split into horizontal strips
+        'reference' - pixel by pixel python loop, kept to validate other backends
+    :param bin_tolerance: edge pixel also votes with displacements
+        from ±bin_tolerance neighbouring gradient bins
+    :param feature_cache: if specified, image edge features are taken from cache
+        (not used by 'reference' backend)
+    :param n_workers: number of threads for backend='parallel' (by default all cores)
     :return: accumulator (array with same shape as input gray_image)
     """
+    if backend not in ("vectorized", "parallel", "reference"):
+        raise ValueError(
+            "`backend` must be either 'vectorized' or 'parallel' or 'reference'"
+        )
+
+    if backend == "reference":
+        return _fill_accumulator_reference(
+            hough_model,
+            source_image,
+            min_canny_treshold,
+            max_canny_treshold,
+            bin_tolerance,
+            feature_cache,
+        )
+
+    accumulators, _ = fill_accumulators(
+        [hough_model],
+        source_image,
+        min_canny_treshold,
+        max_canny_treshold,
+        bin_tolerance,
+        feature_cache,
+        parallel=backend == "parallel",
+        n_workers=n_workers,
+    )
+    return accumulators[0].astype(get_compute_dtype())
+
+
+def image_edges_and_gradients(
+    source_image: np.ndarray,
+    min_canny_treshold: int = 10,
+    max_canny_treshold: int = 50,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute features of the image required for Hough voting.
+
+    :param source_image: RGB or single channel image
+    :return: grayscale image, edges bitmap, gradient orientation of edges
+    """
     # convert to single channel if required
     try:
         source_image_gray = cv.cvtColor(source_image, cv.COLOR_BGR2GRAY)
@@ -143,13 +284,623 @@ def fill_accumulator(
     )
     gradient = calc_gradients(edges)
 
+    return source_image_gray, edges, gradient
+
+
+def image_edge_features(
+    source_image: np.ndarray,
+    n_bins: int,
+    min_canny_treshold: int = 10,
+    max_canny_treshold: int = 50,
+    feature_cache: ImageFeatureCache | None = None,
+) -> ImageFeatures:
+    """
+    Compute edge pixels of the image and their quantized gradient orientation.
+    Only these compact features are kept in cache, full size gray image,
+     edges bitmap and gradient are dropped right after computation.
+
+    :param source_image: RGB or single channel image
+    :param n_bins: number of gradient orientation bins
+    :param feature_cache: cache to take features from (or to store computed features)
+    :return: image features
+    """
+    cache_key = None
+    if feature_cache is not None:
+        cache_key = ImageFeatureCache.key(
+            source_image, n_bins, min_canny_treshold, max_canny_treshold
+        )
+        features = feature_cache.get(cache_key)
+        if features is not None:
+            return features
+
+    source_image_gray, edges, gradient = image_edges_and_gradients(
+        source_image, min_canny_treshold, max_canny_treshold
+    )
+    edge_i, edge_j = np.nonzero(edges)
+    bins_dtype = np.int16 if n_bins <= np.iinfo(np.int16).max else np.int32
+    features = ImageFeatures(
+        shape=(source_image_gray.shape[0], source_image_gray.shape[1]),
+        edge_i=edge_i.astype(np.int32),
+        edge_j=edge_j.astype(np.int32),
+        edge_bins=quantize_angles(gradient[edge_i, edge_j], n_bins).astype(bins_dtype),
+    )
+
+    if feature_cache is not None:
+        feature_cache.put(cache_key, features)
+
+    return features
+
+
+def fill_accumulators(
+    hough_models: List[RTable],
+    source_image: np.ndarray,
+    min_canny_treshold: int = 10,
+    max_canny_treshold: int = 50,
+    bin_tolerance: int = 0,
+    feature_cache: ImageFeatureCache | None = None,
+    parallel: bool = False,
+    n_workers: int | None = None,
+    windows: List[Window | None] | None = None,
+) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    Fill accumulators of several Hough models in a single pass over image edge pixels.
+    All Hough models must have the same number of gradient bins.
+    Edge pixels are grouped by gradient bin, then all displacement vectors
+     are scattered into accumulator with np.bincount.
+
+    Only votes inside the window are stored in the returned accumulator,
+     votes outside the window are kept in a thin frame buffer to get the maximum
+     of the whole accumulator.
+
+    :param parallel: vote in several threads, see `_vote_parallel`
+    :param n_workers: number of threads (by default all cores)
+    :param windows: for every Hough model, bbox (x_min, x_max, y_min, y_max)
+        of the accumulator region to return, by default the whole image
+    :return: accumulators (uint16 or int32 arrays with window shape),
+        maximums of the whole accumulators
+    """
+    hough_model, layers = _merge_hough_models(hough_models)
+
+    features = image_edge_features(
+        source_image,
+        hough_model.n_bins,
+        min_canny_treshold,
+        max_canny_treshold,
+        feature_cache,
+    )
+    height, width = features.shape
+    n_layers = len(hough_models)
+
+    if windows is None:
+        windows = [None] * n_layers
+    layout = _accumulator_layout(windows, height, width)
+
+    # votes in one accumulator cell are bounded by the number of R-table displacements
+    #  (x4 for negative indexes wrap)
+    max_votes = max(len(m) for m in hough_models) * (2 * bin_tolerance + 1) * 4
+    dtype = np.uint16 if max_votes <= np.iinfo(np.uint16).max else np.int32
+    accumulator = np.zeros(layout.window_starts[-1], dtype=dtype)
+    frame = np.zeros(layout.frame_starts[-1], dtype=np.int64)
+
+    # cached features are stored in narrow dtypes, widen them for index arithmetic
+    edge_i = features.edge_i.astype(np.int64)
+    edge_j = features.edge_j.astype(np.int64)
+    edge_bins = features.edge_bins.astype(np.int64)
+
+    if parallel:
+        _vote_parallel(
+            accumulator,
+            frame,
+            edge_i,
+            edge_j,
+            edge_bins,
+            hough_model,
+            layers,
+            layout,
+            bin_tolerance,
+            n_workers,
+        )
+    else:
+        for bin_shift in range(-bin_tolerance, bin_tolerance + 1):
+            bins = (edge_bins + bin_shift) % hough_model.n_bins
+            _scatter_votes(
+                accumulator, frame, edge_i, edge_j, bins, hough_model, layers, layout
+            )
+
+    accumulators = []
+    maximums = np.zeros(n_layers, dtype=np.int64)
+    for k in range(n_layers):
+        window_votes = accumulator[
+            layout.window_starts[k] : layout.window_starts[k + 1]
+        ]
+        frame_votes = frame[layout.frame_starts[k] : layout.frame_starts[k + 1]]
+        maximums[k] = max(window_votes.max(initial=0), frame_votes.max(initial=0))
+
+        window_height = layout.y_max[k] - layout.y_min[k] + 1
+        window_width = layout.x_max[k] - layout.x_min[k] + 1
+        accumulators.append(window_votes.reshape((window_height, window_width)))
+
+    return accumulators, maximums
+
+
+class _AccumulatorLayout(NamedTuple):
+    """
+    Layout of flat window and frame buffers of stacked accumulators.
+    All fields are arrays with value for every accumulator layer.
+    """
+
+    height: int
+    width: int
+    x_min: np.ndarray
+    x_max: np.ndarray
+    y_min: np.ndarray
+    y_max: np.ndarray
+    window_starts: np.ndarray
+    frame_starts: np.ndarray
+
+
+def _accumulator_layout(
+    windows: List[Window | None], height: int, width: int
+) -> _AccumulatorLayout:
+    full_window = (0, width - 1, 0, height - 1)
+    bboxes = np.array(
+        [full_window if w is None else w for w in windows], dtype=np.int64
+    ).reshape(-1, 4)
+    x_min, x_max, y_min, y_max = bboxes.T
+
+    window_sizes = (x_max - x_min + 1) * (y_max - y_min + 1)
+    window_starts = np.zeros(len(bboxes) + 1, dtype=np.int64)
+    window_starts[1:] = np.cumsum(window_sizes)
+
+    frame_starts = np.zeros(len(bboxes) + 1, dtype=np.int64)
+    frame_starts[1:] = np.cumsum(height * width - window_sizes)
+
+    return _AccumulatorLayout(
+        height, width, x_min, x_max, y_min, y_max, window_starts, frame_starts
+    )
+
+
+def _window_indexes(
+    accum_i: np.ndarray, accum_j: np.ndarray, layer: int, layout: _AccumulatorLayout
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Map accumulator cells to positions in window buffer.
+
+    :return: is inside window, index in window buffer (valid only inside window)
+    """
+    x_min, x_max = layout.x_min[layer], layout.x_max[layer]
+    y_min, y_max = layout.y_min[layer], layout.y_max[layer]
+
+    is_inside = (
+        (accum_i >= y_min)
+        & (accum_i <= y_max)
+        & (accum_j >= x_min)
+        & (accum_j <= x_max)
+    )
+    window_indexes = (
+        layout.window_starts[layer]
+        + (accum_i - y_min) * (x_max - x_min + 1)
+        + (accum_j - x_min)
+    )
+
+    return is_inside, window_indexes
+
+
+def _frame_indexes(
+    accum_i: np.ndarray, accum_j: np.ndarray, layer: int, layout: _AccumulatorLayout
+) -> np.ndarray:
+    """
+    Map accumulator cells outside the window to positions in frame buffer.
+    Frame buffer stores rows above the window, rows below the window,
+     then left and right parts of window rows.
+    """
+    width = layout.width
+    x_min, x_max = layout.x_min[layer], layout.x_max[layer]
+    y_min, y_max = layout.y_min[layer], layout.y_max[layer]
+
+    side_width = x_min + (width - 1 - x_max)
+    sides_start = (y_min + layout.height - 1 - y_max) * width
+    frame_indexes = np.where(
+        accum_i < y_min,
+        accum_i * width + accum_j,
+        np.where(
+            accum_i > y_max,
+            (y_min + accum_i - y_max - 1) * width + accum_j,
+            sides_start
+            + (accum_i - y_min) * side_width
+            + np.where(accum_j < x_min, accum_j, x_min + accum_j - x_max - 1),
+        ),
+    )
+    return frame_indexes + layout.frame_starts[layer]
+
+
+def _merge_hough_models(
+    hough_models: List[RTable],
+) -> Tuple[RTable, np.ndarray]:
+    """
+    Merge R-tables into one R-table.
+
+    :return: merged R-table, index of source R-table for every displacement
+    """
+    if len(hough_models) == 1:
+        return hough_models[0], np.zeros(len(hough_models[0]), dtype=np.int64)
+
+    n_bins = hough_models[0].n_bins
+    if any(hough_model.n_bins != n_bins for hough_model in hough_models):
+        raise ValueError("All Hough models must have the same number of bins")
+
+    displacements = np.concatenate([m.displacements for m in hough_models])
+    layers = np.concatenate(
+        [np.full(len(m), i, dtype=np.int64) for i, m in enumerate(hough_models)]
+    )
+    bin_counts = np.sum([m.bin_counts for m in hough_models], axis=0)
+    bins = np.concatenate(
+        [np.repeat(np.arange(n_bins), m.bin_counts) for m in hough_models]
+    )
+
+    order = np.argsort(bins, kind="stable")
+    offsets = np.zeros(n_bins + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(bin_counts)
+
+    return RTable(offsets, displacements[order]), layers[order]
+
+
+def _scatter_votes(
+    accumulator: np.ndarray,
+    frame: np.ndarray,
+    edge_i: np.ndarray,
+    edge_j: np.ndarray,
+    bins: np.ndarray,
+    hough_model: RTable,
+    layers: np.ndarray,
+    layout: _AccumulatorLayout,
+) -> None:
+    """
+    Add votes of edge pixels with given R-table bins
+     into flat window and frame buffers (inplace).
+
+    :param layers: index of accumulator layer for every R-table displacement
+    """
+    height, width = layout.height, layout.width
+    n_layers = len(layout.window_starts) - 1
+    offsets, displacements = hough_model.offsets, hough_model.displacements
+
+    votes_counts = hough_model.bin_counts[bins]
+    has_votes = votes_counts > 0
+    edge_i, edge_j = edge_i[has_votes], edge_j[has_votes]
+    bins, votes_counts = bins[has_votes], votes_counts[has_votes]
+    votes_cumsum = np.cumsum(votes_counts)
+
+    # split edge pixels into chunks to bound memory used by votes arrays
+    total_votes = votes_cumsum[-1] if len(votes_cumsum) else 0
+    chunk_bounds = np.searchsorted(
+        votes_cumsum, np.arange(VOTES_CHUNK_SIZE, total_votes, VOTES_CHUNK_SIZE)
+    )
+    chunk_bounds = np.unique(np.concatenate(([0], chunk_bounds, [len(edge_i)])))
+
+    for start, stop in zip(chunk_bounds[:-1], chunk_bounds[1:]):
+        counts = votes_counts[start:stop]
+        pixel_indexes = np.repeat(np.arange(start, stop), counts)
+        # position of every vote inside displacements array
+        first_votes = np.repeat(np.cumsum(counts) - counts, counts)
+        displacement_indexes = (
+            np.repeat(offsets[bins[start:stop]], counts)
+            + np.arange(len(pixel_indexes))
+            - first_votes
+        )
+
+        accum_i = edge_i[pixel_indexes] + displacements[displacement_indexes, 0]
+        accum_j = edge_j[pixel_indexes] + displacements[displacement_indexes, 1]
+
+        # same bounds check as in reference implementation (negative indexes wrap)
+        is_valid = (
+            (accum_i < height)
+            & (accum_j < width)
+            & (accum_i >= -height)
+            & (accum_j >= -width)
+        )
+        accum_i = accum_i[is_valid] % height
+        accum_j = accum_j[is_valid] % width
+        layer = layers[displacement_indexes[is_valid]]
+        del pixel_indexes, first_votes, displacement_indexes, is_valid
+
+        # votes of every layer are counted separately,
+        #  so bincount covers only the band of one layer buffer
+        if n_layers == 1:
+            _add_layer_votes(accumulator, frame, accum_i, accum_j, 0, layout)
+            continue
+        for k in np.flatnonzero(np.bincount(layer, minlength=n_layers)):
+            is_layer = layer == k
+            _add_layer_votes(
+                accumulator, frame, accum_i[is_layer], accum_j[is_layer], k, layout
+            )
+
+
+def _add_layer_votes(
+    accumulator: np.ndarray,
+    frame: np.ndarray,
+    accum_i: np.ndarray,
+    accum_j: np.ndarray,
+    layer: int,
+    layout: _AccumulatorLayout,
+) -> None:
+    """
+    Add votes of one accumulator layer into flat window and frame buffers (inplace)
+    """
+    is_inside, window_indexes = _window_indexes(accum_i, accum_j, layer, layout)
+    _add_band_votes(accumulator, window_indexes[is_inside])
+    del window_indexes
+
+    is_outside = ~is_inside
+    if np.any(is_outside):
+        frame_indexes = _frame_indexes(
+            accum_i[is_outside], accum_j[is_outside], layer, layout
+        )
+        _add_band_votes(frame, frame_indexes)
+
+
+def _add_band_votes(buffer: np.ndarray, indexes: np.ndarray) -> None:
+    """
+    Add votes into buffer (inplace), counting only between minimal and maximal index.
+    Edge pixels are sorted by rows, so votes of one layer in a chunk lie in a band.
+    """
+    if len(indexes) == 0:
+        return
+    band_start = indexes.min()
+    band_votes = np.bincount(indexes - band_start)
+    band = buffer[band_start : band_start + len(band_votes)]
+    np.add(band, band_votes, out=band, casting="unsafe")
+
+
+def _fill_accumulator_reference(
+    hough_model: RTable,
+    source_image: np.ndarray,
+    min_canny_treshold: int = 10,
+    max_canny_treshold: int = 50,
+    bin_tolerance: int = 0,
+    feature_cache: ImageFeatureCache | None = None,
+) -> np.ndarray:
+    """
+    Perform a General Hough Transform with the given image and R-table (Hough model).
+    Straightforward pixel by pixel implementation, results of other backends are identical.
+
+    :param r_table: Hough model of the template
+    :param source_image: source image where we try to find template (polt image, can be RGB or single channel)
+    :param min_canny_treshold: threshold1 in cv.Canny
+    :param max_canny_treshold: threshold2 in cv.Canny
+    :param bin_tolerance: edge pixel also votes with displacements
+        from ±bin_tolerance neighbouring gradient bins
+    :param feature_cache: ignored, reference backend always computes image features
+    :return: accumulator (array with same shape as input gray_image)
+    """
+    source_image_gray, edges, gradient = image_edges_and_gradients(
+        source_image, min_canny_treshold, max_canny_treshold
+    )
+
     # create and fill accumulator array
-    accumulator = np.zeros(source_image_gray.shape)
+    accumulator = np.zeros(source_image_gray.shape, dtype=get_compute_dtype())
     for (i, j), value in np.ndenumerate(edges):
         if value:
-            for r in hough_model[gradient[i, j]]:
-                accum_i, accum_j = i + r[0], j + r[1]
-                if accum_i < accumulator.shape[0] and accum_j < accumulator.shape[1]:
-                    accumulator[accum_i, accum_j] += 1
+            edge_bin = hough_model.angle_to_bin(gradient[i, j])
+            for bin_shift in range(-bin_tolerance, bin_tolerance + 1):
+                bin_index = (edge_bin + bin_shift) % hough_model.n_bins
+                for r in hough_model.bin_displacements(bin_index):
+                    accum_i, accum_j = i + r[0], j + r[1]
+                    if (
+                        accum_i < accumulator.shape[0]
+                        and accum_j < accumulator.shape[1]
+                    ):
+                        accumulator[accum_i, accum_j] += 1
 
     return accumulator
+
+
+def _vote_parallel(
+    accumulator: np.ndarray,
+    frame: np.ndarray,
+    edge_i: np.ndarray,
+    edge_j: np.ndarray,
+    edge_bins: np.ndarray,
+    hough_model: RTable,
+    layers: np.ndarray,
+    layout: _AccumulatorLayout,
+    bin_tolerance: int = 0,
+    n_workers: int | None = None,
+) -> None:
+    """
+    Multithreaded voting into flat window and frame buffers (inplace).
+    Edge pixels (sorted by rows) are split into horizontal strips
+     with height of R-table displacements range (template reach).
+    Strips are processed in rounds of `n_workers` threads
+     (number of threads is limited by number of cores),
+     every thread fills its strip into private buffer,
+     which covers rows of the strip plus halo of R-table displacements size.
+    Private buffers are summed up after every round,
+     so memory usage is bounded by about two template heights of rows per thread.
+    """
+    height, width = layout.height, layout.width
+    n_layers = len(layout.window_starts) - 1
+    max_threads = numba.config.NUMBA_NUM_THREADS
+    n_workers = max_threads if n_workers is None else n_workers
+    if n_workers < 1:
+        raise ValueError("Param n_workers must be positive")
+    if len(edge_i) == 0:
+        return
+
+    # halo size
+    if len(hough_model):
+        min_di = int(hough_model.displacements[:, 0].min())
+        max_di = int(hough_model.displacements[:, 0].max())
+    else:
+        min_di, max_di = 0, 0
+
+    strip_rows = max_di - min_di + 1
+    row_starts = np.arange(edge_i[0], edge_i[-1] + 1, strip_rows)
+    strip_bounds = np.unique(
+        np.append(np.searchsorted(edge_i, row_starts), len(edge_i))
+    ).astype(np.int64)
+    block_origins = edge_i[strip_bounds[:-1]] + min_di
+    block_heights = (
+        edge_i[strip_bounds[1:] - 1] - edge_i[strip_bounds[:-1]] + max_di - min_di + 1
+    )
+    n_threads = min(n_workers, max_threads, len(block_heights))
+
+    previous_n_workers = numba.get_num_threads()
+    numba.set_num_threads(n_threads)
+    try:
+        _vote_strips_kernel(
+            accumulator,
+            frame,
+            edge_i.astype(np.int64),
+            edge_j.astype(np.int64),
+            edge_bins,
+            hough_model.offsets,
+            hough_model.displacements.astype(np.int64),
+            layers,
+            bin_tolerance,
+            strip_bounds,
+            block_origins.astype(np.int64),
+            block_heights.astype(np.int64),
+            n_threads,
+            height,
+            width,
+            layout.x_min,
+            layout.x_max,
+            layout.y_min,
+            layout.y_max,
+            layout.window_starts,
+            layout.frame_starts,
+        )
+    finally:
+        numba.set_num_threads(previous_n_workers)
+
+
+@njit(parallel=True, cache=True)
+def _vote_strips_kernel(
+    accumulator,
+    frame,
+    edge_i,
+    edge_j,
+    edge_bins,
+    offsets,
+    displacements,
+    layers,
+    bin_tolerance,
+    strip_bounds,
+    block_origins,
+    block_heights,
+    n_threads,
+    height,
+    width,
+    x_min,
+    x_max,
+    y_min,
+    y_max,
+    window_starts,
+    frame_starts,
+):
+    n_bins = len(offsets) - 1
+    n_strips = len(strip_bounds) - 1
+    n_layers = len(window_starts) - 1
+    blocks = np.zeros(
+        (n_threads, block_heights.max() * n_layers * width), dtype=np.int32
+    )
+
+    for round_start in range(0, n_strips, n_threads):
+        round_size = min(n_threads, n_strips - round_start)
+
+        for thread in prange(round_size):
+            strip = round_start + thread
+            origin = block_origins[strip]
+            block_height = block_heights[strip]
+            block = blocks[thread]
+            block[: block_height * n_layers * width] = 0
+
+            for p in range(strip_bounds[strip], strip_bounds[strip + 1]):
+                for bin_shift in range(-bin_tolerance, bin_tolerance + 1):
+                    bin_index = (edge_bins[p] + bin_shift) % n_bins
+                    for d in range(offsets[bin_index], offsets[bin_index + 1]):
+                        accum_i = edge_i[p] + displacements[d, 0]
+                        accum_j = edge_j[p] + displacements[d, 1]
+                        # same bounds check as in reference implementation
+                        if -height <= accum_i < height and -width <= accum_j < width:
+                            row = layers[d] * block_height + accum_i - origin
+                            block[row * width + accum_j % width] += 1
+
+        for thread in range(round_size):
+            _reduce_block(
+                accumulator,
+                frame,
+                blocks[thread],
+                block_origins[round_start + thread],
+                block_heights[round_start + thread],
+                n_layers,
+                height,
+                width,
+                x_min,
+                x_max,
+                y_min,
+                y_max,
+                window_starts,
+                frame_starts,
+            )
+
+
+@njit(cache=True)
+def _reduce_block(
+    accumulator,
+    frame,
+    block,
+    block_origin,
+    block_height,
+    n_layers,
+    height,
+    width,
+    x_min,
+    x_max,
+    y_min,
+    y_max,
+    window_starts,
+    frame_starts,
+):
+    """
+    Add private buffer of a strip into window and frame buffers,
+     negative rows wrap as in reference implementation
+    """
+    for layer in range(n_layers):
+        window_width = x_max[layer] - x_min[layer] + 1
+        side_width = x_min[layer] + width - 1 - x_max[layer]
+        sides_start = (y_min[layer] + height - 1 - y_max[layer]) * width
+
+        for row in range(block_height):
+            accum_i = block_origin + row
+            if not -height <= accum_i < height:
+                continue
+            accum_i = accum_i % height
+            src = (layer * block_height + row) * width
+
+            if accum_i < y_min[layer] or accum_i > y_max[layer]:
+                if accum_i < y_min[layer]:
+                    dst = frame_starts[layer] + accum_i * width
+                else:
+                    dst = (
+                        frame_starts[layer]
+                        + (y_min[layer] + accum_i - y_max[layer] - 1) * width
+                    )
+                for j in range(width):
+                    frame[dst + j] += block[src + j]
+                continue
+
+            dst = window_starts[layer] + (accum_i - y_min[layer]) * window_width
+            for j in range(window_width):
+                accumulator[dst + j] += block[src + x_min[layer] + j]
+
+            dst = (
+                frame_starts[layer]
+                + sides_start
+                + (accum_i - y_min[layer]) * side_width
+            )
+            for j in range(x_min[layer]):
+                frame[dst + j] += block[src + j]
+            for j in range(x_max[layer] + 1, width):
+                frame[dst + x_min[layer] + j - x_max[layer] - 1] += block[src + j]
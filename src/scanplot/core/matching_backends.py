@@ -0,0 +1,192 @@
+import logging
+from typing import Callable, Dict, FrozenSet, List, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from scanplot.types import ArrayNxM, ImageLike
+
+from .fft_template_match import FFT_METHODS, fft_match_template, is_fft_preferable
+from .numba_template_match import (
+    NUMBA_METHODS,
+    TM_SQDIFF_NORMED_MODIFICATION,
+    numba_match_template,
+)
+
+logger = logging.getLogger(__name__)
+
+MATCHING_METHODS: Dict[str, int] = {
+    "cv.TM_SQDIFF": cv.TM_SQDIFF,
+    "cv.TM_SQDIFF_NORMED": cv.TM_SQDIFF_NORMED,
+    "cv.TM_CCORR": cv.TM_CCORR,
+    "cv.TM_CCORR_NORMED": cv.TM_CCORR_NORMED,
+    "cv.TM_CCOEFF": cv.TM_CCOEFF,
+    "cv.TM_CCOEFF_NORMED": cv.TM_CCOEFF_NORMED,
+    "sqdiff_normed_modification": TM_SQDIFF_NORMED_MODIFICATION,
+}
+
+# methods where the best match is the minimum of correlation map
+SQDIFF_METHODS = {cv.TM_SQDIFF, cv.TM_SQDIFF_NORMED, TM_SQDIFF_NORMED_MODIFICATION}
+
+
+class MatchingBackend:
+    """
+    Template matching implementation with declared capabilities.
+
+    :param name: backend name used in `template_match(backend=...)`
+    :param match_function: function(image, template, method, mask) -> correlation map
+    :param methods: supported methods (cv.TM_* constants)
+    :param supports_mask: True if backend can match with template mask
+    :param dtypes: supported image and template dtypes
+    :param thread_safe: True if backend can be called from several threads at once
+    """
+
+    def __init__(
+        self,
+        name: str,
+        match_function: Callable[..., ArrayNxM],
+        methods: FrozenSet[int],
+        supports_mask: bool,
+        dtypes: Tuple[type, ...],
+        thread_safe: bool,
+    ):
+        self.name = name
+        self.match_function = match_function
+        self.methods = frozenset(methods)
+        self.supports_mask = supports_mask
+        self.dtypes = tuple(np.dtype(dtype) for dtype in dtypes)
+        self.thread_safe = thread_safe
+
+    def __repr__(self) -> str:
+        return f"MatchingBackend(name={self.name!r})"
+
+    def supports(
+        self,
+        image: ImageLike,
+        template: ImageLike,
+        method: int,
+        template_mask: ArrayNxM | None = None,
+    ) -> bool:
+        if method not in self.methods:
+            return False
+        if template_mask is not None and not self.supports_mask:
+            return False
+        return image.dtype in self.dtypes and template.dtype in self.dtypes
+
+    def match(
+        self,
+        image: ImageLike,
+        template: ImageLike,
+        method: int,
+        template_mask: ArrayNxM | None = None,
+    ) -> ArrayNxM:
+        return self.match_function(image, template, method, template_mask)
+
+
+def _opencv_match_template(
+    image: ImageLike,
+    template: ImageLike,
+    method: int,
+    mask: ArrayNxM | None = None,
+) -> ArrayNxM:
+    if mask is not None:
+        return cv.matchTemplate(image, template, method, mask=mask)
+    return cv.matchTemplate(image, template, method)
+
+
+_MATCHING_BACKENDS: Dict[str, MatchingBackend] = dict()
+
+
+def register_matching_backend(backend: MatchingBackend) -> None:
+    """
+    Add backend to registry (backend with the same name is replaced)
+    """
+    _MATCHING_BACKENDS[backend.name] = backend
+
+
+def get_matching_backend(name: str) -> MatchingBackend:
+    if name not in _MATCHING_BACKENDS:
+        raise ValueError(
+            f"Unknown matching backend '{name}', available backends: {available_matching_backends()}"
+        )
+    return _MATCHING_BACKENDS[name]
+
+
+def available_matching_backends() -> List[str]:
+    return list(_MATCHING_BACKENDS.keys())
+
+
+def resolve_method(method_name: str) -> int:
+    """
+    Convert method name (e.g. 'cv.TM_SQDIFF_NORMED') to method id
+    """
+    if method_name not in MATCHING_METHODS:
+        raise ValueError(
+            f"Unknown matching method '{method_name}', available methods: {list(MATCHING_METHODS)}"
+        )
+    return MATCHING_METHODS[method_name]
+
+
+def select_matching_backend(
+    image: ImageLike,
+    template: ImageLike,
+    method: int,
+    template_mask: ArrayNxM | None = None,
+) -> MatchingBackend:
+    """
+    Auto selection policy:
+     FFT for large masked templates (see is_fft_preferable), then OpenCV,
+     then any other registered backend that supports given input.
+    """
+    fft_backend = _MATCHING_BACKENDS.get("fft")
+    if (
+        fft_backend is not None
+        and fft_backend.supports(image, template, method, template_mask)
+        and is_fft_preferable(image, template, method, template_mask)
+    ):
+        return fft_backend
+
+    opencv_backend = _MATCHING_BACKENDS.get("opencv")
+    if opencv_backend is not None and opencv_backend.supports(
+        image, template, method, template_mask
+    ):
+        return opencv_backend
+
+    for backend in _MATCHING_BACKENDS.values():
+        if backend.supports(image, template, method, template_mask):
+            return backend
+
+    raise ValueError(f"No matching backend supports method {method} for given input")
+
+
+register_matching_backend(
+    MatchingBackend(
+        name="opencv",
+        match_function=_opencv_match_template,
+        methods=frozenset(MATCHING_METHODS.values()) - {TM_SQDIFF_NORMED_MODIFICATION},
+        supports_mask=True,
+        dtypes=(np.uint8, np.float32),
+        thread_safe=True,
+    )
+)
+register_matching_backend(
+    MatchingBackend(
+        name="fft",
+        match_function=fft_match_template,
+        methods=frozenset(FFT_METHODS),
+        supports_mask=True,
+        dtypes=(np.uint8, np.float32, np.float64),
+        thread_safe=True,
+    )
+)
+register_matching_backend(
+    MatchingBackend(
+        name="numba",
+        match_function=numba_match_template,
+        methods=frozenset(NUMBA_METHODS),
+        supports_mask=True,
+        dtypes=(np.uint8, np.float32, np.float64),
+        # numba parallel layer (workqueue) is not thread safe
+        thread_safe=False,
+    )
+)
@@ -1,7 +1,13 @@
-from typing import List, Tuple
+import logging
+from typing import Dict, List, Tuple
 
 import numpy as np
 from lsnms import nms
+from numba import njit
+
+from scanplot.types import ArrayNx2
+
+logger = logging.getLogger(__name__)
 
 
 def apply_nms(
@@ -10,7 +16,19 @@ def apply_nms(
     iou_treshold: float,
     bbox_width: int,
     bbox_height: int,
+    grid_cell_size: int | None = None,
 ) -> np.ndarray:
+    """
+    :param points: top left corners of bboxes (points of correlation map), shape=(n, 2)
+    :param grid_cell_size: if specified, only the best scored point in each grid cell
+        of given size is passed to NMS (see `grid_prefilter`)
+    :return: centers of kept bboxes, shape=(n, 2)
+    """
+    points = np.asarray(points).reshape(-1, 2)
+    if grid_cell_size is not None:
+        points = grid_prefilter(
+            points, correlation_map[points[:, 1], points[:, 0]], grid_cell_size
+        )
 
     bboxes, scores = get_bbox_from_corr_map_point(
         points, bbox_width, bbox_height, correlation_map
@@ -22,18 +40,15 @@ def apply_nms(
     return actual_points
 
 
-def point_to_bbox(y: int, x: int, w: int, h: int, correlation_map: np.ndarray) -> Tuple:
+def point_to_bbox(y, x, w: int, h: int, correlation_map: np.ndarray) -> Tuple:
     """
     Map some point on convolution map to bbox on the source image.
+    Coordinates may be integers or arrays of integers.
     """
     x_min, y_min = x, y
     x_max = x + w - 1
     y_max = y + h - 1
 
-    # # check that indexes are valid
-    # correlation_map[y_min, x_min]
-    # correlation_map[y_max, x_max]
-
     return x_min, y_min, x_max, y_max
     # return x_min - 0.5, y_min - 0.5, x_max + 0.5, y_max + 0.5  # for drawing
 
@@ -43,24 +58,46 @@ def get_bbox_from_corr_map_point(
 ) -> Tuple[np.ndarray, np.ndarray]:
     """
     :param box_width, box_height: size of bounding box, same as template image size
-    :param points: centers of bboxes, array with shape=(n, 2)
-    :return: bboxes shape=(n, 4); scores shape=(n,)
+    :param points: top left corners of bboxes, array with shape=(n, 2)
+    :return: bboxes shape=(n, 4) (float32); scores shape=(n,)
     """
-    n = len(points)
-    scores = np.zeros(n)
-    bboxes = np.zeros((n, 4))
-
-    for i, point in enumerate(points):
-        y, x = point[1], point[0]
-        x_min, y_min, x_max, y_max = point_to_bbox(
-            y, x, box_width, box_height, correlation_map
-        )
-        bboxes[i] = np.array([x_min, y_min, x_max, y_max])
-        scores[i] = correlation_map[y, x]
+    points = np.asarray(points).reshape(-1, 2)
+    x, y = points[:, 0], points[:, 1]
+    bboxes = np.column_stack(
+        point_to_bbox(y, x, box_width, box_height, correlation_map)
+    ).astype(np.float32)
+    scores = correlation_map[y, x]
 
     return bboxes, scores
 
 
+def grid_prefilter(
+    points: np.ndarray, scores: np.ndarray, cell_size: int
+) -> np.ndarray:
+    """
+    Keep only the point with the best score in each grid cell (duplicates are removed too).
+    Points of the same cell almost always suppress each other in NMS,
+     if cell size is small relative to bbox size.
+
+    :param points: array with shape=(n, 2)
+    :param scores: array with shape=(n,)
+    :param cell_size: size of grid cell in pixels
+    :return: filtered points in the same order
+    """
+    if cell_size < 1:
+        raise ValueError("Grid cell size must be positive")
+    if len(points) == 0:
+        return points
+
+    cells = points // cell_size
+    cells -= cells.min(axis=0)
+    cell_keys = cells[:, 1] * (cells[:, 0].max() + 1) + cells[:, 0]
+    # best score first within each cell
+    order = np.lexsort((-scores, cell_keys))
+    _, first_indexes = np.unique(cell_keys[order], return_index=True)
+    return points[np.sort(order[first_indexes])]
+
+
 def get_bbox_center(bboxes):
     """
     bbox = x_min, y_min, x_max, y_max
@@ -84,3 +121,158 @@ def get_bbox_by_center_point(center_point, width, height):
     y_max = y_c + height // 2
     bbox = x_min, x_max, y_min, y_max
     return bbox
+
+
+class NMSIndex:
+    """
+    Greedy NMS of equal size boxes, precomputed for any IoU treshold.
+
+    Candidates must be sorted by score in descending order (e.g. PeakIndex points),
+     so decision for each box depends only on boxes before it, and NMS result
+     for the first n candidates is the first n elements of the full result.
+    Overlapping pairs are found once; for each box the maximal IoU
+     with any higher-scoring box (suppression IoU) is stored,
+     boxes with suppression IoU less than treshold are kept without any checks.
+    Greedy NMS result is not monotonic in IoU treshold, so it is computed over
+     the precomputed overlaps and cached for each interval between distinct IoU values.
+    Semantic is the same as in `apply_nms`: box is suppressed by kept box if IoU >= treshold.
+
+    :param points: top left corners of boxes (x, y) with shape=(n, 2), sorted by score
+    :param bbox_width, bbox_height: size of boxes, same as template image size
+    """
+
+    def __init__(self, points: ArrayNx2, bbox_width: int, bbox_height: int):
+        self.points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        self.bbox_width = bbox_width
+        self.bbox_height = bbox_height
+
+        self._indptr, self._neighbours, self._ious = _overlapping_pairs(
+            self.points, bbox_width, bbox_height
+        )
+        self.suppression_iou = np.zeros(len(self.points))
+        has_neighbours = np.diff(self._indptr) > 0
+        self.suppression_iou[has_neighbours] = np.maximum.reduceat(
+            self._ious, self._indptr[:-1][has_neighbours]
+        )
+        self._iou_values = np.unique(self._ious)
+        self._keep_cache: Dict[int, np.ndarray] = dict()
+
+        logger.debug(
+            f"NMS index built: {len(self.points)} boxes, {len(self._ious)} overlapping pairs"
+        )
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def keep(self, iou_treshold: float) -> np.ndarray:
+        """
+        :return: bool mask of boxes kept by greedy NMS, shape=(n,)
+        """
+        # result depends only on the set of pairs with IoU >= treshold
+        interval = int(np.searchsorted(self._iou_values, iou_treshold, side="left"))
+        if interval not in self._keep_cache:
+            self._keep_cache[interval] = _greedy_nms_keep(
+                self._indptr,
+                self._neighbours,
+                self._ious,
+                self.suppression_iou,
+                float(iou_treshold),
+            )
+        return self._keep_cache[interval]
+
+    def detect(self, n_candidates: int, iou_treshold: float) -> ArrayNx2:
+        """
+        Apply NMS to the first n_candidates boxes
+
+        :return: centers of kept boxes, array with shape=(n, 2)
+        """
+        kept_points = self.points[:n_candidates][self.keep(iou_treshold)[:n_candidates]]
+        x_center = kept_points[:, 0] + (self.bbox_width - 1) / 2
+        y_center = kept_points[:, 1] + (self.bbox_height - 1) / 2
+        return np.stack((x_center, y_center)).T
+
+
+def _overlapping_pairs(
+    points: ArrayNx2, bbox_width: int, bbox_height: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find pairs of overlapping boxes with spatial grid (cell size is equal to box size)
+
+    :return: CSR arrays (indptr, neighbours, ious), neighbours of box i
+        are higher-scoring boxes (with less index) overlapping box i
+    """
+    # boxes (x, y, x + w - 1, y + h - 1) have area (w - 1) * (h - 1), as in lsnms
+    width, height = bbox_width - 1, bbox_height - 1
+    if len(points) == 0 or width <= 0 or height <= 0:
+        return (
+            np.zeros(len(points) + 1, dtype=np.int64),
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0),
+        )
+
+    cells_x = points[:, 0] // width
+    cells_y = points[:, 1] // height
+    # extra empty column, so neighbour cells of the first column do not wrap to previous row
+    stride = cells_x.max() + 2
+    cell_keys = (cells_y + 1) * stride + cells_x
+    order = np.argsort(cell_keys, kind="stable")
+
+    return _overlapping_pairs_kernel(
+        points, cell_keys, order, cell_keys[order], stride, width, height
+    )
+
+
+@njit(cache=True)
+def _overlapping_pairs_kernel(
+    points, cell_keys, order, sorted_keys, stride, width, height
+):
+    n = len(points)
+    area = float(width * height)
+    counts = np.zeros(n + 1, dtype=np.int64)
+
+    # first pass counts pairs, second pass fills them
+    for fill in (False, True):
+        if fill:
+            indptr = np.cumsum(counts)
+            neighbours = np.empty(indptr[-1], dtype=np.int64)
+            ious = np.empty(indptr[-1], dtype=np.float64)
+        for i in range(n):
+            position = 0
+            for cell_dy in (-1, 0, 1):
+                for cell_dx in (-1, 0, 1):
+                    key = cell_keys[i] + cell_dy * stride + cell_dx
+                    start = np.searchsorted(sorted_keys, key, side="left")
+                    end = np.searchsorted(sorted_keys, key, side="right")
+                    for m in range(start, end):
+                        j = order[m]
+                        if j >= i:
+                            continue
+                        overlap_x = width - abs(points[i, 0] - points[j, 0])
+                        overlap_y = height - abs(points[i, 1] - points[j, 1])
+                        if overlap_x <= 0 or overlap_y <= 0:
+                            continue
+                        if fill:
+                            overlap = float(overlap_x * overlap_y)
+                            neighbours[indptr[i] + position] = j
+                            ious[indptr[i] + position] = overlap / (
+                                area + area - overlap
+                            )
+                        else:
+                            counts[i + 1] += 1
+                        position += 1
+
+    return indptr, neighbours, ious
+
+
+@njit(cache=True)
+def _greedy_nms_keep(indptr, neighbours, ious, suppression_iou, iou_treshold):
+    n = len(suppression_iou)
+    keep = np.ones(n, dtype=np.bool_)
+    for i in range(n):
+        if suppression_iou[i] < iou_treshold:
+            continue
+        for k in range(indptr[i], indptr[i + 1]):
+            if keep[neighbours[k]] and ious[k] >= iou_treshold:
+                keep[i] = False
+                break
+    return keep
@@ -0,0 +1,191 @@
+import logging
+
+import cv2 as cv
+import numpy as np
+from numba import njit, prange
+
+from scanplot.types import ArrayNxM, ImageLike
+
+logger = logging.getLogger(__name__)
+
+# custom method id, does not intersect with OpenCV TM_* constants
+TM_SQDIFF_NORMED_MODIFICATION = 100
+
+NUMBA_METHODS = {cv.TM_SQDIFF_NORMED, TM_SQDIFF_NORMED_MODIFICATION}
+
+
+def numba_match_template(
+    image: ImageLike,
+    template: ImageLike,
+    method: int,
+    mask: ArrayNxM | None = None,
+    image_mask: ArrayNxM | None = None,
+    ratio_treshold: float = 0.5,
+) -> ArrayNxM:
+    """
+    Compiled template matching for SQDIFF_NORMED and its modification
+     (see utils.convolution_from_stratch.sqdiff_normed_modification).
+
+    SQDIFF_NORMED modification is NaN at positions where less than `ratio_treshold`
+     of template object pixels lie on image object pixels (e.g. on white background).
+    Mask semantic is the same as in OpenCV: mask is treated as binary.
+
+    :param method: one of cv.TM_SQDIFF_NORMED, TM_SQDIFF_NORMED_MODIFICATION
+    :param mask: template mask, 2D or with the same number of channels as template
+    :param image_mask: 2D array, nonzero values refer to image object pixels
+        (by default all not white pixels), used only by modification
+    :param ratio_treshold: minimal ratio of template object pixels on image object pixels
+    :return: correlation map (float32) with the same shape as cv.matchTemplate output
+    """
+    if method not in NUMBA_METHODS:
+        raise ValueError(f"Method {method} is not supported by numba matching")
+    if image.ndim != template.ndim:
+        raise ValueError("Image and template must have the same number of channels")
+
+    image_height, image_width = image.shape[0], image.shape[1]
+    template_height, template_width = template.shape[0], template.shape[1]
+
+    image = image.astype(np.float64).reshape(image_height, image_width, -1)
+    template = template.astype(np.float64).reshape(template_height, template_width, -1)
+
+    if mask is None:
+        template_mask = np.ones((template_height, template_width), dtype=bool)
+    else:
+        template_mask = mask.reshape(template_height, template_width, -1).any(axis=2)
+
+    if method == TM_SQDIFF_NORMED_MODIFICATION:
+        if image_mask is None:
+            image_mask = np.any(image != 255, axis=2)
+        image_mask = np.ascontiguousarray(image_mask != 0, dtype=np.uint8)
+    else:
+        image_mask = np.ones((image_height, image_width), dtype=np.uint8)
+        ratio_treshold = 0.0
+
+    points_y, points_x = np.nonzero(template_mask)
+    runs_y, runs_x_from, runs_x_to = _mask_row_runs(template_mask)
+    # prefix sums along rows: window sums over template mask rows are taken as differences
+    mask_prefix = _row_prefix_sum(image_mask.astype(np.int64))
+    square_prefix = _row_prefix_sum(np.sum(image**2, axis=2))
+
+    correlation_map = _sqdiff_normed_kernel(
+        np.ascontiguousarray(image.transpose(2, 0, 1)),
+        np.ascontiguousarray(template[points_y, points_x]),
+        points_y.astype(np.int64),
+        points_x.astype(np.int64),
+        runs_y,
+        runs_x_from,
+        runs_x_to,
+        mask_prefix,
+        square_prefix,
+        image_height - template_height + 1,
+        image_width - template_width + 1,
+        float(ratio_treshold),
+    )
+
+    # OpenCV clips normed results without mask (and fills windows with zero norm)
+    if mask is None and method == cv.TM_SQDIFF_NORMED:
+        correlation_map = np.nan_to_num(np.minimum(correlation_map, 1), nan=1)
+
+    return correlation_map.astype(np.float32)
+
+
+def _mask_row_runs(mask: ArrayNxM) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Split nonzero pixels of 2D mask into horizontal runs
+
+    :return: row, first column and last column + 1 of each run
+    """
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask != 0
+    changes = np.diff(padded, axis=1)
+    runs_y, runs_x_from = np.nonzero(changes == 1)
+    _, runs_x_to = np.nonzero(changes == -1)
+    return (
+        runs_y.astype(np.int64),
+        runs_x_from.astype(np.int64),
+        runs_x_to.astype(np.int64),
+    )
+
+
+def _row_prefix_sum(array: ArrayNxM) -> ArrayNxM:
+    """
+    prefix[y, x] = sum of array[y, :x]
+    """
+    prefix = np.zeros((array.shape[0], array.shape[1] + 1), dtype=array.dtype)
+    np.cumsum(array, axis=1, out=prefix[:, 1:])
+    return prefix
+
+
+@njit(parallel=True, cache=True, error_model="numpy")
+def _sqdiff_normed_kernel(
+    image_planes,
+    template_values,
+    points_y,
+    points_x,
+    runs_y,
+    runs_x_from,
+    runs_x_to,
+    mask_prefix,
+    square_prefix,
+    map_height,
+    map_width,
+    ratio_treshold,
+):
+    """
+    Rows of correlation map are processed in parallel.
+    Number of image object pixels and image norm under template mask
+     are computed from row prefix sums over horizontal runs of template mask,
+     only cross-correlation term is summed over all template object pixels:
+     sqdiff = template_norm + image_norm - 2 * cross_correlation.
+    """
+    n_points, n_channels = template_values.shape
+    n_runs = len(runs_y)
+    template_norm = 0.0
+    for k in range(n_points):
+        for c in range(n_channels):
+            template_norm += template_values[k, c] ** 2
+
+    min_object_points = ratio_treshold * n_points
+    correlation_map = np.empty((map_height, map_width), dtype=np.float64)
+
+    for y in prange(map_height):
+        is_valid = np.ones(map_width, dtype=np.bool_)
+        if min_object_points > 0:
+            for x in range(map_width):
+                object_points = 0
+                for r in range(n_runs):
+                    row = y + runs_y[r]
+                    object_points += (
+                        mask_prefix[row, x + runs_x_to[r]]
+                        - mask_prefix[row, x + runs_x_from[r]]
+                    )
+                is_valid[x] = object_points >= min_object_points
+
+        # cross-correlation of the whole row, inner loop goes along image row (of one channel)
+        cross_correlation = np.zeros(map_width, dtype=np.float64)
+        for k in range(n_points):
+            for c in range(n_channels):
+                template_value = template_values[k, c]
+                image_row = image_planes[
+                    c, y + points_y[k], points_x[k] : points_x[k] + map_width
+                ]
+                for x in range(map_width):
+                    cross_correlation[x] += template_value * image_row[x]
+
+        for x in range(map_width):
+            if not is_valid[x]:
+                correlation_map[y, x] = np.nan
+                continue
+
+            image_norm = 0.0
+            for r in range(n_runs):
+                row = y + runs_y[r]
+                image_norm += (
+                    square_prefix[row, x + runs_x_to[r]]
+                    - square_prefix[row, x + runs_x_from[r]]
+                )
+
+            sqdiff = max(template_norm + image_norm - 2 * cross_correlation[x], 0.0)
+            correlation_map[y, x] = sqdiff / np.sqrt(template_norm * image_norm)
+
+    return correlation_map
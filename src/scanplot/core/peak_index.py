@@ -0,0 +1,55 @@
+import logging
+from typing import Tuple
+
+import numpy as np
+
+from scanplot.types import ArrayNx2, ArrayNxM
+
+from .corr_map_operations import local_maxima
+
+logger = logging.getLogger(__name__)
+
+
+class PeakIndex:
+    """
+    Local maxima of correlation map sorted by value (in descending order).
+    Peaks above any treshold are taken with binary search and slice,
+     so correlation map is scanned only once.
+
+    :param correlation_map: 2D array
+    :param min_treshold: peaks with lower values are not stored
+    """
+
+    def __init__(self, correlation_map: ArrayNxM, min_treshold: float = 0.0):
+        points, scores = local_maxima(correlation_map, min_treshold)
+        order = np.argsort(-scores, kind="stable")
+
+        self.min_treshold = min_treshold
+        self.points: ArrayNx2 = points[order]
+        self.scores: np.ndarray = scores[order]
+
+        logger.debug(
+            f"Peak index built: {len(self.scores)} peaks with value >= {min_treshold}"
+        )
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def count(self, treshold: float) -> int:
+        """
+        Number of peaks with value >= treshold
+        """
+        if treshold < self.min_treshold:
+            raise ValueError(
+                f"Treshold {treshold} is less than min_treshold of index {self.min_treshold}"
+            )
+        return int(np.searchsorted(-self.scores, -treshold, side="right"))
+
+    def peaks(self, treshold: float) -> Tuple[ArrayNx2, np.ndarray]:
+        """
+        Return peaks with value >= treshold
+
+        :return: points (x, y) with shape=(n, 2), values with shape=(n,)
+        """
+        n_peaks = self.count(treshold)
+        return self.points[:n_peaks], self.scores[:n_peaks]
@@ -89,3 +89,54 @@ def invert_image(image: ImageLike) -> ImageLike:
         logger.warning("It seems that image has white background")
 
     return cv.bitwise_not(image)
+
+
+def image_foreground(image: ImageLike, treshold: float | int) -> ArrayNxM:
+    """
+    Return bool mask of image pixels darker than treshold
+     (the same pixels as objects in process_template.image_tresholding)
+    """
+    if len(image.shape) == 3:
+        image_gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+    else:
+        image_gray = image
+    return image_gray < treshold
+
+
+def foreground_under_template(
+    foreground: ArrayNxM, template_mask: ArrayNxM
+) -> ArrayNxM:
+    """
+    For every template position on the image check whether
+     any foreground pixel is covered by nonzero template mask pixels.
+    Same as `cv.matchTemplate(foreground, template_mask, cv.TM_CCORR) > 0`,
+     but computed with binary dilation (or with summed-area table for rectangular mask).
+
+    :param foreground: 2D bool mask of image foreground
+    :param template_mask: 2D template mask
+    :return: bool map with the same shape as cv.matchTemplate output
+    """
+    template_mask = template_mask != 0
+    template_height, template_width = template_mask.shape
+    map_height = foreground.shape[0] - template_height + 1
+    map_width = foreground.shape[1] - template_width + 1
+
+    if not np.any(template_mask):
+        return np.zeros((map_height, map_width), dtype=bool)
+
+    foreground = foreground.astype(np.uint8, copy=False)
+
+    if np.all(template_mask):
+        # number of foreground pixels in every template window
+        integral = cv.integral(foreground)
+        counts = (
+            integral[template_height:, template_width:]
+            - integral[:map_height, template_width:]
+            - integral[template_height:, :map_width]
+            + integral[:map_height, :map_width]
+        )
+        return counts > 0
+
+    # dilation with anchor (0, 0) takes maximum over template footprint placed at each position
+    dilated = cv.dilate(foreground, template_mask.astype(np.uint8), anchor=(0, 0))
+    return dilated[:map_height, :map_width] > 0
@@ -0,0 +1,57 @@
+import logging
+from typing import List, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from scanplot.types import ArrayNxM, ImageLike
+
+logger = logging.getLogger(__name__)
+
+# templates smaller than this size (on any pyramid level) are not matched
+MIN_PYRAMID_TEMPLATE_SIZE = 8
+
+# images smaller than this area are matched densely, on the bundled plots
+#  (0.2-0.9 Mpx) pyramid matching is slower than dense matching
+MIN_PYRAMID_IMAGE_AREA = 1024 * 1024
+
+
+def build_pyramid(image: ImageLike, levels: int) -> List[ImageLike]:
+    """
+    Return list of images [image, image / 2, image / 4, ...] with `levels + 1` elements
+    """
+    pyramid = [image]
+    for _ in range(levels):
+        pyramid.append(cv.pyrDown(pyramid[-1]))
+    return pyramid
+
+
+def build_mask_pyramid(
+    mask: ArrayNxM, image_pyramid: List[ImageLike]
+) -> List[ArrayNxM]:
+    """
+    Resize bitmap mask to the shape of every image in pyramid (mask stays bitmap)
+    """
+    mask_pyramid = [mask]
+    for image in image_pyramid[1:]:
+        height, width = image.shape[0], image.shape[1]
+        mask_pyramid.append(
+            cv.resize(mask, (width, height), interpolation=cv.INTER_NEAREST)
+        )
+    return mask_pyramid
+
+
+def max_pyramid_levels(
+    image_shape: Tuple[int, ...], template_shape: Tuple[int, ...], levels: int
+) -> int:
+    """
+    Reduce number of pyramid levels, so that downscaled template is not too small.
+    Small images get no pyramid levels at all.
+    """
+    if image_shape[0] * image_shape[1] < MIN_PYRAMID_IMAGE_AREA:
+        return 0
+
+    template_size = min(template_shape[0], template_shape[1])
+    while levels > 0 and template_size / 2**levels < MIN_PYRAMID_TEMPLATE_SIZE:
+        levels -= 1
+    return levels
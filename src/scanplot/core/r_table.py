@@ -0,0 +1,122 @@
+import logging
+from typing import Tuple
+
+import numpy as np
+
+from scanplot.types import ArrayN, ArrayNx2, ArrayNxM, PathLike
+
+logger = logging.getLogger(__name__)
+
+
+class RTable:
+    """
+    Array-backed R-table of the Generalized Hough Transform.
+
+    Gradient orientations (degrees, from -180 to 180) are quantized into `n_bins` bins.
+    Displacements of all bins are stored in one contiguous array,
+     displacements of bin k are displacements[offsets[k] : offsets[k + 1]].
+    """
+
+    def __init__(
+        self,
+        offsets: ArrayN,
+        displacements: ArrayNx2,
+        reference_point: Tuple[int, int] = (0, 0),
+    ):
+        self.offsets: ArrayN = np.asarray(offsets, dtype=np.int64)
+        self.displacements: ArrayNx2 = np.ascontiguousarray(
+            displacements, dtype=np.int32
+        ).reshape(-1, 2)
+        self.reference_point: Tuple[int, int] = tuple(int(p) for p in reference_point)
+
+        if self.offsets[-1] != len(self.displacements):
+            raise ValueError("R-table offsets do not match displacements array")
+
+    @property
+    def n_bins(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def bin_counts(self) -> ArrayN:
+        return np.diff(self.offsets)
+
+    def __len__(self) -> int:
+        return len(self.displacements)
+
+    def bin_displacements(self, bin_index: int) -> ArrayNx2:
+        """
+        Return displacements stored in given gradient orientation bin
+        """
+        return self.displacements[self.offsets[bin_index] : self.offsets[bin_index + 1]]
+
+    def angle_to_bin(self, angle: float | np.ndarray) -> int | np.ndarray:
+        """
+        Quantize gradient orientation in degrees into bin index
+        """
+        return quantize_angles(angle, self.n_bins)
+
+    @classmethod
+    def from_edges(
+        cls,
+        edges: ArrayNxM,
+        gradient: ArrayNxM,
+        reference_point: Tuple[int, int],
+        n_bins: int = 360,
+        max_points: int | None = None,
+        random_state: int = 0,
+    ) -> "RTable":
+        """
+        Build R-table from the template edges.
+
+        :param edges: bitmap image of template edges
+        :param gradient: gradient orientation of template edges (degrees)
+        :param reference_point: (i, j) position of the point to vote for
+        :param n_bins: number of gradient orientation bins
+        :param max_points: if specified and template has more edge points,
+            random subset of `max_points` edge points is used
+        :param random_state: seed for edge points subsampling
+        """
+        if n_bins < 1:
+            raise ValueError("Param n_bins must be positive")
+
+        edge_i, edge_j = np.nonzero(edges)
+
+        if max_points is not None and len(edge_i) > max_points:
+            rng = np.random.default_rng(random_state)
+            selected = np.sort(rng.choice(len(edge_i), size=max_points, replace=False))
+            edge_i, edge_j = edge_i[selected], edge_j[selected]
+            logger.debug(f"Template edge points subsampled to {max_points}")
+
+        bins = quantize_angles(gradient[edge_i, edge_j], n_bins)
+
+        # stable sort keeps raster order of edge points inside every bin
+        order = np.argsort(bins, kind="stable")
+        displacements = np.stack(
+            (reference_point[0] - edge_i[order], reference_point[1] - edge_j[order])
+        ).T
+
+        offsets = np.zeros(n_bins + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(bins, minlength=n_bins))
+
+        return cls(offsets, displacements, reference_point)
+
+    def save(self, path: PathLike) -> None:
+        np.savez(
+            path,
+            offsets=self.offsets,
+            displacements=self.displacements,
+            reference_point=np.array(self.reference_point),
+        )
+
+    @classmethod
+    def load(cls, path: PathLike) -> "RTable":
+        with np.load(path) as data:
+            return cls(data["offsets"], data["displacements"], data["reference_point"])
+
+
+def quantize_angles(angle: float | np.ndarray, n_bins: int) -> int | np.ndarray:
+    """
+    Map angles in degrees (from -180 to 180) into `n_bins` equal bins
+    """
+    bin_index = np.floor((np.asarray(angle) + 180) * n_bins / 360)
+    return bin_index.astype(np.int64) % n_bins
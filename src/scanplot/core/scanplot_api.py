@@ -7,13 +7,22 @@ import numpy as np
 from scanplot.plotting import draw_image, draw_ROI
 from scanplot.types import ArrayNxM, ImageLike
 
-from .color_filter import filter_by_colors, get_dominant_marker_colors
+from .color_filter import (
+    color_bitmask,
+    color_distance_maps,
+    filter_by_color_bitmask,
+    get_dominant_marker_colors,
+)
 from .corr_map_operations import normalize_map
+from .feature_cache import ImageFeatureCache
 from .hough_transform import generalized_hough_transform
+from .matching_backends import get_matching_backend, resolve_method
 from .preprocess import (
     _apply_roi,
     _restructure_bboxes,
     bboxes_to_roi,
+    foreground_under_template,
+    image_foreground,
     replace_black_pixels,
 )
 from .process_template import (
@@ -22,10 +31,25 @@ from .process_template import (
     get_template_mask,
     image_tresholding,
 )
+from .pyramid import build_mask_pyramid, build_pyramid, max_pyramid_levels
 from .template_match import template_match
+from .windowed_match import (
+    Window,
+    candidate_windows,
+    match_in_windows,
+    roi_windows,
+    windows_coverage,
+)
 
 logger = logging.getLogger(__name__)
 
+# coarse correlation map values considered as candidates in pyramid matching
+#  (less than minimal correlation map treshold used in Detector)
+PYRAMID_CANDIDATE_TRESHOLD = 0.1
+# if candidate windows cover more of correlation map than this fraction,
+#  matching in windows is slower than dense matching
+PYRAMID_MAX_WINDOWS_COVERAGE = 0.3
+
 
 class Plot:
     def __init__(self, image: ImageLike):
@@ -40,6 +64,11 @@ class Plot:
         self._images_algorithm_input: dict[str, ImageLike] = dict()
         self._correlation_maps: dict[str, ArrayNxM] = dict()
         # self._correlation_maps_adjusted: dict[str, ArrayNxM] = dict()
+        self._feature_cache = ImageFeatureCache()
+        # marker label -> (marker template, plot image, color distance map)
+        self._color_distance_maps: dict[str, tuple[ImageLike, ImageLike, ArrayNxM]] = (
+            dict()
+        )
 
     @property
     def n_channels(self) -> int:
@@ -92,6 +121,9 @@ class Plot:
         mode: Literal["basic", "color", "binary"] = "color",
         color_delta: int = 100,
         shape_factor: float = 0.6,
+        pyramid_levels: int = 0,
+        backend: str = "auto",
+        method_name: str = "cv.TM_SQDIFF_NORMED",
     ) -> dict[str, ArrayNxM]:
         """
         Computes correlation map for each marker.
@@ -104,12 +136,27 @@ class Plot:
                 (useful for black and white images with dense areas of overlapping markers)
         :param color_delta: color sensitivity, used only in in mode='color'
         :param shape_factor: weight coefficient from 0 to inf, higher values give more preference to the shape of the marker than the color
+        :param pyramid_levels: number of downscaling levels for coarse-to-fine matching,
+            0 means dense matching on full resolution image.
+            On each finer level matching is computed only around candidates from coarser level.
+        :param backend: template matching backend, 'auto' or one of registered backends
+            (see matching_backends.available_matching_backends())
+        :param method_name: template matching method, see matching_backends.MATCHING_METHODS.
+             'sqdiff_normed_modification' - SQDIFF_NORMED, which rejects positions
+                where template object mostly lies on image background (numba backend)
         """
         if not self.markers:
             raise ValueError(f"You have not selected any markers")
         if mode not in {"basic", "color", "binary"}:
             raise ValueError("`mode` must be either 'basic' or 'color' or 'binary'")
+        if backend != "auto":
+            get_matching_backend(backend)
+        resolve_method(method_name)
+
+        # in color mode each marker gets its own filtered image, nothing to share
+        feature_cache = self._feature_cache if mode != "color" else None
 
+        templates_to_match: dict[str, ImageLike] = dict()
         for marker_label, marker_image in self.markers.items():
 
             # plot_image_to_process = self._images_algorithm_input[marker_label]
@@ -122,18 +169,6 @@ class Plot:
             self._marker_masks[marker_label] = template_mask
             self._treshold_values[marker_label] = treshold_value
 
-            if mode == "color":
-                marker_dominant_colors = get_dominant_marker_colors(
-                    self.markers[marker_label],
-                    n_colors=3,
-                )
-                image_filtered = filter_by_colors(
-                    image=self._images_algorithm_input[marker_label],
-                    colors=marker_dominant_colors,
-                    color_delta=color_delta,
-                )
-                self._images_algorithm_input[marker_label] = image_filtered
-
             if mode == "binary":
                 template_image, _ = image_tresholding(
                     image=self.markers[marker_label],
@@ -149,29 +184,116 @@ class Plot:
                 )
                 self._images_algorithm_input[marker_label] = plot_image_binary
 
+            templates_to_match[marker_label] = template_image
+
+        if mode == "color":
+            self._update_color_distance_maps()
+            self._images_algorithm_input.update(
+                self._filter_by_marker_colors(color_delta)
+            )
+
+        # markers with restricted ROI are matched only in windows around ROI
+        windows_by_marker: dict[str, list[Window]] = dict()
+        for marker_label, template_image in templates_to_match.items():
+            if not np.all(self._roi[marker_label]):
+                windows_by_marker[marker_label] = roi_windows(
+                    self._roi[marker_label], template_image.shape
+                )
+
+        if pyramid_levels > 0:
+            for marker_label, template_image in list(templates_to_match.items()):
+                corr_map = self._match_single_marker_pyramid(
+                    plot_image=self._images_algorithm_input[marker_label],
+                    marker_template_image=template_image,
+                    marker_template_mask=self._marker_masks[marker_label],
+                    marker_treshold_value=self._treshold_values[marker_label],
+                    shape_factor=shape_factor,
+                    pyramid_levels=pyramid_levels,
+                    backend=backend,
+                    method_name=method_name,
+                )
+                # otherwise marker falls back to dense matching below
+                if corr_map is not None:
+                    self._correlation_maps[marker_label] = corr_map
+                    del templates_to_match[marker_label]
+
+        for marker_label, windows in windows_by_marker.items():
+            if marker_label not in templates_to_match:
+                continue
+            self._correlation_maps[marker_label] = match_in_windows(
+                plot_image=self._images_algorithm_input[marker_label],
+                template_image=templates_to_match.pop(marker_label),
+                template_mask=self._marker_masks[marker_label],
+                shape_factor=shape_factor,
+                windows=windows,
+                backend=backend,
+                method_name=method_name,
+            )
+
+        # markers that share the same input image get Hough accumulators in a single pass
+        accumulators = self._shared_hough_transform(templates_to_match)
+
+        for marker_label, template_image in templates_to_match.items():
             # pass plot image with applied ROI
             corr_map = self._match_single_marker(
                 plot_image=self._images_algorithm_input[marker_label],
                 marker_template_image=template_image,
-                marker_template_mask=template_mask,
+                marker_template_mask=self._marker_masks[marker_label],
                 shape_factor=shape_factor,
+                feature_cache=feature_cache,
+                accumulator=accumulators.get(marker_label),
+                backend=backend,
+                method_name=method_name,
             )
             self._correlation_maps[marker_label] = corr_map
 
+        # features are only reused within a single run, don't keep them alive
+        self._feature_cache.clear()
+
         # postprocess correlation maps
+        #  (image foreground is shared by markers with the same input image and treshold value)
+        foregrounds: list[tuple[ImageLike, float | int, ArrayNxM]] = []
         for marker_label, marker_image in self.markers.items():
+            plot_image = self._images_algorithm_input[marker_label]
+            treshold_value = self._treshold_values[marker_label]
+
+            for other_image, other_treshold_value, foreground in foregrounds:
+                if other_treshold_value == treshold_value and np.array_equal(
+                    other_image, plot_image
+                ):
+                    break
+            else:
+                foreground = image_foreground(plot_image, treshold_value)
+                foregrounds.append((plot_image, treshold_value, foreground))
 
             corr_map_adjusted = self._postprocess_correlation_map(
                 correlation_map=self._correlation_maps[marker_label],
-                marker_treshold_value=self._treshold_values[marker_label],
-                plot_image_to_process=self._images_algorithm_input[marker_label],
+                marker_treshold_value=treshold_value,
+                plot_image_to_process=plot_image,
                 marker_mask=self._marker_masks[marker_label],
+                windows=windows_by_marker.get(marker_label),
+                plot_image_foreground=foreground,
             )
             # self._correlation_maps_adjusted[marker_label] = corr_map_adjusted
             self._correlation_maps[marker_label] = corr_map_adjusted
 
         return self._correlation_maps
 
+    def refilter_by_colors(self, color_delta: int) -> dict[str, ImageLike]:
+        """
+        Regenerate color filtered plot images with another color sensitivity,
+         using color distance maps precomputed in `run_matching(mode='color')`.
+
+        :param color_delta: color sensitivity
+        :return: dict with filtered plot image for each marker
+        """
+        if not any(m in self._color_distance_maps for m in self.markers):
+            raise ValueError(
+                "Color distance maps are not computed, run matching with mode='color' first"
+            )
+
+        return self._filter_by_marker_colors(color_delta)
+
     def draw(self):
         draw_image(self.data)
 
@@ -190,29 +312,243 @@ class Plot:
             self._roi[marker_label] = np.copy(roi_array)
             self._images_algorithm_input[marker_label] = np.copy(self.data)
 
+    def _shared_hough_transform(
+        self, templates: dict[str, ImageLike]
+    ) -> dict[str, ArrayNxM]:
+        """
+        If all markers are matched on the same input image,
+         compute Hough accumulators for all markers in a single pass over image edges.
+        Otherwise return empty dict.
+        """
+        marker_labels = list(templates.keys())
+        if len(marker_labels) < 2:
+            return dict()
+
+        first_image = self._images_algorithm_input[marker_labels[0]]
+        for marker_label in marker_labels[1:]:
+            if not np.array_equal(
+                first_image, self._images_algorithm_input[marker_label]
+            ):
+                return dict()
+
+        accumulators = generalized_hough_transform(
+            first_image,
+            list(templates.values()),
+            norm_result=True,
+            crop_result=True,
+            feature_cache=self._feature_cache,
+        )
+        return dict(zip(marker_labels, accumulators))
+
+    def _update_color_distance_maps(self) -> None:
+        """
+        Compute maps of distances from plot image pixels to the dominant colors of each marker.
+        Maps of markers with the same plot image are computed in a single pass over the image.
+        Map is reused while plot image and marker image are the same.
+        """
+        # drop maps of markers that are no longer selected
+        for marker_label in set(self._color_distance_maps) - set(self.markers):
+            del self._color_distance_maps[marker_label]
+
+        outdated_plot_images: dict[str, ImageLike] = dict()
+        for marker_label, marker_image in self.markers.items():
+            plot_image = self._images_algorithm_input[marker_label]
+            if marker_label in self._color_distance_maps:
+                cached_marker, cached_plot_image, _ = self._color_distance_maps[
+                    marker_label
+                ]
+                if np.array_equal(cached_marker, marker_image) and np.array_equal(
+                    cached_plot_image, plot_image
+                ):
+                    continue
+            outdated_plot_images[marker_label] = plot_image
+
+        for plot_image, marker_labels in self._group_by_image(outdated_plot_images):
+            marker_color_sets = [
+                get_dominant_marker_colors(self.markers[marker_label], n_colors=3)
+                for marker_label in marker_labels
+            ]
+            distance_maps = color_distance_maps(plot_image, marker_color_sets)
+            for marker_label, distance_map in zip(marker_labels, distance_maps):
+                self._color_distance_maps[marker_label] = (
+                    self.markers[marker_label],
+                    plot_image,
+                    distance_map,
+                )
+
+    def _filter_by_marker_colors(self, color_delta: int) -> dict[str, ImageLike]:
+        """
+        Filter plot image by colors of each marker with precomputed color distance maps.
+        Pixels of the plot image are classified by colors of all markers at once (see `color_bitmask`).
+        """
+        plot_images = {
+            marker_label: self._color_distance_maps[marker_label][1]
+            for marker_label in self.markers
+            if marker_label in self._color_distance_maps
+        }
+
+        images_filtered = dict()
+        for plot_image, marker_labels in self._group_by_image(plot_images):
+            bitmask = color_bitmask(
+                [
+                    self._color_distance_maps[marker_label][2]
+                    for marker_label in marker_labels
+                ],
+                color_delta,
+            )
+            for bit_index, marker_label in enumerate(marker_labels):
+                images_filtered[marker_label] = filter_by_color_bitmask(
+                    plot_image, bitmask, bit_index
+                )
+        return images_filtered
+
+    @staticmethod
+    def _group_by_image(
+        images: dict[str, ImageLike]
+    ) -> list[tuple[ImageLike, list[str]]]:
+        """
+        Group marker labels by equal images.
+
+        :param images: dict with image for each marker label
+        :return: list of (image, marker labels)
+        """
+        groups: list[tuple[ImageLike, list[str]]] = []
+        for marker_label, image in images.items():
+            for group_image, marker_labels in groups:
+                if group_image is image or np.array_equal(group_image, image):
+                    marker_labels.append(marker_label)
+                    break
+            else:
+                groups.append((image, [marker_label]))
+        return groups
+
     @staticmethod
     def _match_single_marker(
         plot_image: ImageLike,
         marker_template_image: ImageLike,
         marker_template_mask: ArrayNxM,
         shape_factor: float,
+        feature_cache: ImageFeatureCache | None = None,
+        accumulator: ArrayNxM | None = None,
+        backend: str = "auto",
+        method_name: str = "cv.TM_SQDIFF_NORMED",
     ) -> ArrayNxM:
         """
         Returns a correlation map
+
+        :param accumulator: precomputed Hough accumulator (computed if not specified)
+        :param backend: template matching backend
+        :param method_name: template matching method
         """
         correlation_map, _ = template_match(
-            plot_image, marker_template_image, marker_template_mask, norm_result=True
+            plot_image,
+            marker_template_image,
+            marker_template_mask,
+            method_name=method_name,
+            norm_result=True,
+            backend=backend,
         )
 
-        accumulator = generalized_hough_transform(
-            plot_image, marker_template_image, norm_result=True, crop_result=True
-        )
+        if accumulator is None:
+            accumulator = generalized_hough_transform(
+                plot_image,
+                marker_template_image,
+                norm_result=True,
+                crop_result=True,
+                feature_cache=feature_cache,
+            )
 
         assert correlation_map.shape == accumulator.shape
 
-        correlation_map_with_hough = correlation_map + shape_factor * accumulator
-        correlation_map_with_hough = normalize_map(correlation_map_with_hough)
-        return correlation_map_with_hough
+        # correlation map is not used anywhere else, so it is modified inplace
+        correlation_map += shape_factor * accumulator
+        return normalize_map(correlation_map, inplace=True)
+
+    @classmethod
+    def _match_single_marker_pyramid(
+        cls,
+        plot_image: ImageLike,
+        marker_template_image: ImageLike,
+        marker_template_mask: ArrayNxM,
+        marker_treshold_value: float | int,
+        shape_factor: float,
+        pyramid_levels: int,
+        backend: str = "auto",
+        method_name: str = "cv.TM_SQDIFF_NORMED",
+    ) -> ArrayNxM | None:
+        """
+        Returns a correlation map computed in coarse-to-fine manner.
+        Dense matching is done only on the coarsest level, on finer levels
+         correlation map is computed only in windows around candidates.
+        Correlation map values outside the windows are zero.
+
+        Returns None when dense matching is expected to be faster:
+         image or template is too small for the pyramid,
+         or candidate windows cover most of the correlation map.
+        """
+        levels = max_pyramid_levels(
+            plot_image.shape, marker_template_image.shape, pyramid_levels
+        )
+        if levels == 0:
+            logger.debug("Image or template is too small for pyramid matching")
+            return None
+        if levels < pyramid_levels:
+            logger.debug(
+                f"Number of pyramid levels reduced to {levels}, template is too small"
+            )
+
+        image_pyramid = build_pyramid(plot_image, levels)
+        template_pyramid = build_pyramid(marker_template_image, levels)
+        mask_pyramid = build_mask_pyramid(marker_template_mask, template_pyramid)
+
+        correlation_map = cls._match_single_marker(
+            plot_image=image_pyramid[levels],
+            marker_template_image=template_pyramid[levels],
+            marker_template_mask=mask_pyramid[levels],
+            shape_factor=shape_factor,
+            backend=backend,
+            method_name=method_name,
+        )
+
+        for level in range(levels - 1, -1, -1):
+            # prevent candidates on white background
+            correlation_map = cls._postprocess_correlation_map(
+                correlation_map=correlation_map,
+                marker_treshold_value=marker_treshold_value,
+                plot_image_to_process=image_pyramid[level + 1],
+                marker_mask=mask_pyramid[level + 1],
+            )
+
+            image, template = image_pyramid[level], template_pyramid[level]
+            map_shape = (
+                image.shape[0] - template.shape[0] + 1,
+                image.shape[1] - template.shape[1] + 1,
+            )
+            windows = candidate_windows(
+                correlation_map, PYRAMID_CANDIDATE_TRESHOLD, target_shape=map_shape
+            )
+            coverage = windows_coverage(windows, map_shape)
+            if coverage > PYRAMID_MAX_WINDOWS_COVERAGE:
+                logger.debug(
+                    f"Pyramid level {level}: windows cover {coverage:.1%} of correlation map, use dense matching"
+                )
+                return None
+            correlation_map = match_in_windows(
+                plot_image=image,
+                template_image=template,
+                template_mask=mask_pyramid[level],
+                shape_factor=shape_factor,
+                windows=windows,
+                backend=backend,
+                method_name=method_name,
+            )
+
+            computed_area = np.mean(correlation_map != 0)
+            logger.debug(
+                f"Pyramid level {level}: {len(windows)} windows, {computed_area:.1%} of correlation map computed"
+            )
+
+        return correlation_map
 
     @staticmethod
     def _preprocess_template(
@@ -239,38 +575,51 @@ class Plot:
         marker_treshold_value: float | int,
         plot_image_to_process: ImageLike,
         marker_mask: ArrayNxM,
+        windows: list[Window] | None = None,
+        plot_image_foreground: ArrayNxM | None = None,
     ) -> ArrayNxM:
         """
         Step to prevent detections in the area of the white background of the image.
-        Turns to zero corr map values on image background positions.
+        Turns to zero corr map values on positions where template mask
+         does not cover any foreground pixel of the image.
 
-        Background area on image is computed using tresholding with the same treshold value
+        Foreground area on image is computed using tresholding with the same treshold value
          that was used in template tresholding.
 
         :param correlation_map: initial corr map
         :param marker_treshold_value: treshold value from which template mask was calculated
         :param plot_image_to_process: plot image after preprocessing steps
         :param marker_mask: bitmap image with template mask
+        :param windows: bboxes (x_min, x_max, y_min, y_max) on the corr map to process,
+            corr map values outside the windows are turned to zero (whole map is processed if not specified)
+        :param plot_image_foreground: precomputed result of `image_foreground` (computed if not specified)
         """
-        plot_image_mask, _ = image_tresholding(
-            image=plot_image_to_process, treshold=marker_treshold_value
-        )
+        if plot_image_foreground is None:
+            plot_image_foreground = image_foreground(
+                plot_image_to_process, marker_treshold_value
+            )
 
         assert np.all(np.unique(marker_mask) == [0, 255]), "Marker Mask is not correct bitmap"  # fmt: skip
-        assert np.all(np.unique(plot_image_mask) == [0, 255]), "Image Mask is not correct bitmap"  # fmt: skip
-
-        marker_mask = marker_mask / 255
-        plot_image_mask = plot_image_mask / 255
-        marker_mask = marker_mask.astype(np.uint8)
-        plot_image_mask = plot_image_mask.astype(np.uint8)
-
-        masks_correlation_map, _ = template_match(
-            image=plot_image_mask,
-            template=marker_mask,
-            method_name="cv.TM_CCORR",
-            norm_result=False,
-        )
-        masks_correlation_map_bitmap = (masks_correlation_map > 0.1).astype(np.float64)
 
-        correlation_map_adjusted = correlation_map * masks_correlation_map_bitmap
+        if windows is None:
+            masks_correlation_map_bitmap = foreground_under_template(
+                plot_image_foreground, marker_mask
+            )
+        else:
+            masks_correlation_map_bitmap = np.zeros(correlation_map.shape, dtype=bool)
+            template_height, template_width = marker_mask.shape[0], marker_mask.shape[1]
+            for x_min, x_max, y_min, y_max in windows:
+                masks_correlation_map_bitmap[y_min : y_max + 1, x_min : x_max + 1] = (
+                    foreground_under_template(
+                        plot_image_foreground[
+                            y_min : y_max + template_height,
+                            x_min : x_max + template_width,
+                        ],
+                        marker_mask,
+                    )
+                )
+
+        correlation_map_adjusted = np.multiply(
+            correlation_map, masks_correlation_map_bitmap, out=correlation_map
+        )
         return correlation_map_adjusted
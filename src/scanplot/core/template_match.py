@@ -11,7 +11,14 @@ logger = logging.getLogger(__name__)
 
 from scanplot.types import ArrayNxM, ImageLike
 
-from .corr_map_operations import invert_correlation_map, normalize_map
+from .corr_map_operations import as_compute_dtype, invert_correlation_map, normalize_map
+from .matching_backends import (
+    SQDIFF_METHODS,
+    get_matching_backend,
+    resolve_method,
+    select_matching_backend,
+)
+from .numba_template_match import TM_SQDIFF_NORMED_MODIFICATION
 
 
 def template_match(
@@ -20,29 +27,50 @@ def template_match(
     template_mask: ArrayNxM | None = None,
     method_name: str = "cv.TM_SQDIFF_NORMED",
     norm_result: bool = False,
+    backend: str = "auto",
+    invert_result: bool = True,
 ) -> Tuple[ArrayNxM, float]:
     """
-    Run opencv templateMatch.
+    Run opencv templateMatch (or its equivalent from another backend).
     Return correlation map and maximum value on map.
     Normalize output map if required.
+
+    :param method_name: one of matching_backends.MATCHING_METHODS, e.g. 'cv.TM_SQDIFF_NORMED'
+    :param backend: 'auto' or name of registered matching backend ('opencv', 'fft', 'numba')
+        'auto' - FFT matching for large masked templates, otherwise opencv
+    :param invert_result: invert map of SQDIFF methods, so that best match is maximum
+
+    Positions rejected by 'sqdiff_normed_modification' (template on image background)
+     are NaN, in inverted map they get the worst value (zero).
     """
-    method = eval(method_name)
-    if template_mask is not None:
-        correlation_map = cv.matchTemplate(image, template, method, mask=template_mask)
+    method = resolve_method(method_name)
+    if backend == "auto":
+        matching_backend = select_matching_backend(
+            image, template, method, template_mask
+        )
     else:
-        correlation_map = cv.matchTemplate(image, template, method)
+        matching_backend = get_matching_backend(backend)
+        if not matching_backend.supports(image, template, method, template_mask):
+            raise ValueError(
+                f"Backend '{backend}' does not support method {method_name} for given input"
+            )
+
+    correlation_map = matching_backend.match(image, template, method, template_mask)
+    correlation_map = as_compute_dtype(correlation_map)
 
-    if method in [cv.TM_SQDIFF, cv.TM_SQDIFF_NORMED]:
+    if method in SQDIFF_METHODS and invert_result:
         logger.debug(
             f"Correlation map bounds: {np.nanmin(correlation_map), np.nanmax(correlation_map)}"
         )
         logger.debug("Correlation map was inverted")
-        correlation_map = invert_correlation_map(correlation_map)
+        correlation_map = invert_correlation_map(correlation_map, inplace=True)
+        if method == TM_SQDIFF_NORMED_MODIFICATION:
+            correlation_map = np.nan_to_num(correlation_map, copy=False, nan=0)
 
     min_val, max_val, min_loc, max_loc = cv.minMaxLoc(correlation_map)
 
     if norm_result:
-        correlation_map = normalize_map(correlation_map)
+        correlation_map = normalize_map(correlation_map, inplace=True)
 
     return correlation_map, max_val
 
@@ -0,0 +1,173 @@
+import logging
+from typing import List, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from scanplot.types import ArrayNxM, ImageLike
+
+from .corr_map_operations import get_compute_dtype
+from .hough_transform import generalized_hough_transform
+from .matching_backends import SQDIFF_METHODS, resolve_method
+from .template_match import template_match
+
+logger = logging.getLogger(__name__)
+
+# bbox (x_min, x_max, y_min, y_max) on correlation map, borders included
+Window = Tuple[int, int, int, int]
+
+# extra image pixels around window, to get the same edges as on the whole image
+EDGES_MARGIN = 3
+
+
+def match_in_windows(
+    plot_image: ImageLike,
+    template_image: ImageLike,
+    template_mask: ArrayNxM,
+    shape_factor: float,
+    windows: List[Window],
+    backend: str = "auto",
+    method_name: str = "cv.TM_SQDIFF_NORMED",
+) -> ArrayNxM:
+    """
+    Compute correlation map (template matching + hough transform)
+     only inside given windows of the correlation map.
+    Correlation map values outside the windows are zero.
+
+    Template matching and hough maps are normalized by values computed in all windows,
+     so if windows cover the whole map the result is the same as for dense matching.
+
+    :param windows: list of bboxes (x_min, x_max, y_min, y_max) on the correlation map
+    :param backend: template matching backend
+    :param method_name: template matching method, see template_match.template_match
+    :return: correlation map, shape is the same as cv.matchTemplate output
+    """
+    image_height, image_width = plot_image.shape[0], plot_image.shape[1]
+    template_height, template_width = template_image.shape[0], template_image.shape[1]
+    map_shape = (image_height - template_height + 1, image_width - template_width + 1)
+
+    dtype = get_compute_dtype()
+    sqdiff_map = np.zeros(map_shape, dtype=dtype)
+    accumulator = np.zeros(map_shape, dtype=dtype)
+    is_computed = np.zeros(map_shape, dtype=bool)
+
+    for x_min, x_max, y_min, y_max in windows:
+        image_part = plot_image[
+            y_min : y_max + template_height, x_min : x_max + template_width
+        ]
+        sqdiff_map[y_min : y_max + 1, x_min : x_max + 1], _ = template_match(
+            image_part,
+            template_image,
+            template_mask,
+            method_name=method_name,
+            backend=backend,
+            invert_result=False,
+        )
+
+        # hough transform is computed on a slightly bigger image part
+        y_from, x_from = max(y_min - EDGES_MARGIN, 0), max(x_min - EDGES_MARGIN, 0)
+        y_to = min(y_max + template_height + EDGES_MARGIN, image_height)
+        x_to = min(x_max + template_width + EDGES_MARGIN, image_width)
+        window_accumulator = generalized_hough_transform(
+            plot_image[y_from:y_to, x_from:x_to],
+            template_image,
+            norm_result=False,
+            crop_result=True,
+        )
+        accumulator[y_min : y_max + 1, x_min : x_max + 1] = window_accumulator[
+            y_min - y_from : y_max - y_from + 1, x_min - x_from : x_max - x_from + 1
+        ]
+        is_computed[y_min : y_max + 1, x_min : x_max + 1] = True
+
+    correlation_map = np.zeros(map_shape, dtype=dtype)
+    if not np.any(is_computed):
+        return correlation_map
+
+    # same inversion and normalization as in dense template matching
+    sqdiff_values = sqdiff_map[is_computed]
+    if resolve_method(method_name) in SQDIFF_METHODS:
+        sqdiff_values = np.nanmax(sqdiff_values) - sqdiff_values
+    template_match_values = np.nan_to_num(
+        sqdiff_values / np.nanmax(sqdiff_values), nan=0
+    )
+    accumulator_values = accumulator[is_computed] / np.nanmax(accumulator[is_computed])
+
+    correlation_values = template_match_values + shape_factor * accumulator_values
+    correlation_map[is_computed] = correlation_values / np.nanmax(correlation_values)
+
+    return correlation_map
+
+
+def windows_coverage(windows: List[Window], map_shape: Tuple[int, int]) -> float:
+    """
+    Return fraction of correlation map covered by windows (overlaps counted once)
+    """
+    is_covered = np.zeros(map_shape, dtype=bool)
+    for x_min, x_max, y_min, y_max in windows:
+        is_covered[y_min : y_max + 1, x_min : x_max + 1] = True
+    return float(np.mean(is_covered))
+
+
+def candidate_windows(
+    correlation_map: ArrayNxM,
+    treshold: float,
+    target_shape: Tuple[int, int],
+    pad: int = 4,
+) -> List[Window]:
+    """
+    Find windows around correlation map values greater than treshold
+     and map them on correlation map of another (usually bigger) shape.
+
+    :param correlation_map: correlation map (e.g. computed on downscaled image)
+    :param treshold: correlation map values considered as candidates
+    :param target_shape: shape of correlation map where windows are used
+    :param pad: number of pixels added around candidates on target map
+    :return: list of bboxes (x_min, x_max, y_min, y_max) on the target map
+    """
+    candidates = (np.nan_to_num(correlation_map) >= treshold).astype(np.uint8)
+    target_height, target_width = target_shape
+
+    candidates = cv.resize(
+        candidates, (target_width, target_height), interpolation=cv.INTER_NEAREST
+    )
+    if pad > 0:
+        kernel = np.ones((2 * pad + 1, 2 * pad + 1), dtype=np.uint8)
+        candidates = cv.dilate(candidates, kernel)
+
+    n_labels, _, stats, _ = cv.connectedComponentsWithStats(candidates, connectivity=8)
+
+    windows = []
+    for label in range(1, n_labels):
+        x, y, width, height = stats[label, :4]
+        windows.append((int(x), int(x + width - 1), int(y), int(y + height - 1)))
+
+    return windows
+
+
+def roi_windows(roi: ArrayNxM, template_shape: Tuple[int, ...]) -> List[Window]:
+    """
+    Find windows on correlation map where template overlaps ROI.
+
+    :param roi: 2D array with values (0, 1) where 1 refers to ROI, 0 refers to restricted area
+    :param template_shape: shape of the template image
+    :return: list of bboxes (x_min, x_max, y_min, y_max) on the correlation map
+    """
+    template_height, template_width = template_shape[0], template_shape[1]
+    map_height = roi.shape[0] - template_height + 1
+    map_width = roi.shape[1] - template_width + 1
+
+    roi_bitmap = (roi > 0).astype(np.uint8)
+    n_labels, _, stats, _ = cv.connectedComponentsWithStats(roi_bitmap, connectivity=8)
+
+    windows = []
+    for label in range(1, n_labels):
+        x, y, width, height = stats[label, :4]
+        # all template positions that have at least one pixel inside ROI bbox
+        x_min, x_max = max(x - template_width + 1, 0), min(x + width - 1, map_width - 1)
+        y_min, y_max = max(y - template_height + 1, 0), min(
+            y + height - 1, map_height - 1
+        )
+        if x_min <= x_max and y_min <= y_max:
+            windows.append((int(x_min), int(x_max), int(y_min), int(y_max)))
+
+    return windows
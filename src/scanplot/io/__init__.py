@@ -1,2 +1,2 @@
-from .read_image import load_image
-from .saving import dump_coords_csv, save_markers
+from .read_image import ImageInfo, load_image, load_image_preview, probe_image
+from .saving import DetectionsWriter, dump_coords_csv, load_detections, save_markers
@@ -1,14 +1,111 @@
+import hashlib
+import logging
+import pathlib
+from typing import NamedTuple
+
 import cv2 as cv
+import numpy as np
+from PIL import Image
 
 from scanplot.types import ImageLike, PathLike
 
+logger = logging.getLogger(__name__)
+
+# reduce factor -> (color flag, grayscale flag)
+_REDUCED_READ_FLAGS = {
+    1: (cv.IMREAD_COLOR, cv.IMREAD_GRAYSCALE),
+    2: (cv.IMREAD_REDUCED_COLOR_2, cv.IMREAD_REDUCED_GRAYSCALE_2),
+    4: (cv.IMREAD_REDUCED_COLOR_4, cv.IMREAD_REDUCED_GRAYSCALE_4),
+    8: (cv.IMREAD_REDUCED_COLOR_8, cv.IMREAD_REDUCED_GRAYSCALE_8),
+}
+
+
+class ImageInfo(NamedTuple):
+    width: int
+    height: int
+    channels: int
+
+
+def load_image(
+    img_path: PathLike,
+    grayscale: bool = False,
+    reduce_factor: int = 1,
+    cache_dir: PathLike | None = None,
+) -> ImageLike:
+    """
+    :param reduce_factor: one of 1, 2, 4, 8, image size is reduced by this factor while decoding
+        (JPEG is decoded at reduced resolution, other formats are resized after decoding)
+    :param cache_dir: directory for decoded images, if specified, image is decoded once
+        and then returned as read-only memory-mapped array from .npy file
+    """
+    if reduce_factor not in _REDUCED_READ_FLAGS:
+        raise ValueError(f"Reduce factor must be one of {list(_REDUCED_READ_FLAGS)}")
+    color_flag, grayscale_flag = _REDUCED_READ_FLAGS[reduce_factor]
+    flag = grayscale_flag if grayscale else color_flag
+
+    if cache_dir is not None:
+        return _load_image_cached(img_path, flag, pathlib.Path(cache_dir))
+
+    return _read_image(img_path, flag)
+
+
+def probe_image(img_path: PathLike) -> ImageInfo:
+    """
+    Return size and number of channels stored in image file, only image header is read
+    """
+    try:
+        with Image.open(img_path) as img:
+            width, height = img.size
+            channels = len(img.getbands())
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No such image: {str(img_path)}")
+    return ImageInfo(width, height, channels)
+
+
+def load_image_preview(
+    img_path: PathLike, max_size: int, grayscale: bool = False
+) -> ImageLike:
+    """
+    Load image with the greatest reduce factor (see `load_image`),
+     such that the larger image side is not less than max_size
+    """
+    info = probe_image(img_path)
+    reduce_factor = 1
+    for factor in sorted(_REDUCED_READ_FLAGS):
+        if max(info.width, info.height) // factor >= max_size:
+            reduce_factor = factor
+    return load_image(img_path, grayscale=grayscale, reduce_factor=reduce_factor)
 
-def load_image(img_path: PathLike, grayscale: bool = False) -> ImageLike:
-    if grayscale:
-        img = cv.imread(str(img_path), cv.IMREAD_GRAYSCALE)
-    else:
-        img = cv.imread(str(img_path))
+
+def _read_image(img_path: PathLike, flag: int) -> ImageLike:
+    img = cv.imread(str(img_path), flag)
 
     if img is None:
         raise FileNotFoundError(f"No such image: {str(img_path)}")
     return img
+
+
+def _load_image_cached(
+    img_path: PathLike, flag: int, cache_dir: pathlib.Path
+) -> ImageLike:
+    img_path = pathlib.Path(img_path).resolve()
+    if not img_path.is_file():
+        raise FileNotFoundError(f"No such image: {str(img_path)}")
+
+    # cache is invalidated when image file is modified
+    stat = img_path.stat()
+    key = hashlib.blake2b(
+        f"{img_path}:{stat.st_mtime_ns}:{stat.st_size}:{flag}".encode(), digest_size=16
+    ).hexdigest()
+    cache_path = cache_dir / f"{img_path.stem}_{key}.npy"
+
+    if not cache_path.exists():
+        img = _read_image(img_path, flag)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # write to temporary file first, so that partially written cache is never loaded
+        tmp_path = cache_path.with_suffix(".tmp.npy")
+        np.save(tmp_path, img)
+        tmp_path.replace(cache_path)
+        logger.debug(f"Decoded image cached to {str(cache_path)}")
+
+    return np.load(cache_path, mmap_mode="r")
@@ -1,5 +1,6 @@
 import logging
 import pathlib
+import zipfile
 
 import cv2 as cv
 import numpy as np
@@ -27,3 +28,258 @@ def save_markers(
             img=marker,
         )
         logger.debug(f"Marker saved to {str(savepath)}")
+
+
+DETECTIONS_FORMATS = ("npz", "parquet", "arrow")
+
+# columns with few distinct values, buffered as int32 codes into per-chunk array of names
+_CODED_COLUMNS = ("image", "marker")
+
+
+class DetectionsWriter:
+    """
+    Columnar writer of detections of many images and markers into a single file.
+    Rows are buffered and written in chunks, so detections are not kept in memory.
+
+    Columns: image, marker, x, y and optional score, x_factual, y_factual
+     (optional columns must be given either for all rows or for none,
+     including rows appended to existing file).
+
+    Formats:
+     'npz' - each chunk is appended to zip archive as separate .npy members,
+        existing file can be appended (see `load_detections`).
+        Image and marker columns are stored as int32 codes plus array of names
+     'parquet', 'arrow' - chunks are written as row groups / record batches (requires pyarrow)
+
+    :param path: output file path
+    :param file_format: one of 'npz', 'parquet', 'arrow'
+    :param append: append to existing file (only 'npz')
+    :param chunk_size: number of buffered rows written at once
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path | str,
+        file_format: str = "npz",
+        append: bool = False,
+        chunk_size: int = 100_000,
+    ):
+        if file_format not in DETECTIONS_FORMATS:
+            raise ValueError(
+                f"Unknown format '{file_format}', available formats: {DETECTIONS_FORMATS}"
+            )
+        if append and file_format != "npz":
+            raise ValueError(
+                "Append to existing file is supported only for 'npz' format"
+            )
+        if file_format != "npz":
+            # fail before any rows are buffered
+            _import_pyarrow(file_format)
+
+        self.path = pathlib.Path(path)
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+
+        self._buffer: list[dict[str, np.ndarray]] = []
+        self._buffered_rows = 0
+        self._columns: tuple[str, ...] | None = None
+        # column -> name -> code, for buffered rows
+        self._codes: dict[str, dict[str, int]] = {c: dict() for c in _CODED_COLUMNS}
+        self._arrow_writer = None
+        self._chunk_index = 0
+
+        if file_format == "npz":
+            if append and self.path.exists():
+                with zipfile.ZipFile(self.path) as archive:
+                    names = archive.namelist()
+                self._chunk_index = len({_npz_chunk_index(name) for name in names})
+                # appended rows must have the same columns as written rows
+                first_chunk = min(names, key=_npz_chunk_index, default=None)
+                if first_chunk is not None:
+                    self._columns = tuple(
+                        _npz_column(name)
+                        for name in names
+                        if _npz_chunk_index(name) == _npz_chunk_index(first_chunk)
+                        and not _npz_column(name).endswith("_names")
+                    )
+            else:
+                self.path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "DetectionsWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(
+        self,
+        image: str,
+        detections: dict[str, np.ndarray],
+        scores: dict[str, np.ndarray] | None = None,
+        factual_detections: dict[str, np.ndarray] | None = None,
+    ) -> None:
+        """
+        Add detections of one image.
+        Rows of all markers are checked before buffering,
+         so invalid detections do not leave partially written image.
+
+        :param image: image name or path
+        :param detections: marker label -> points (x, y) with shape=(n, 2)
+        :param scores: marker label -> scores with shape=(n,)
+        :param factual_detections: marker label -> converted points with shape=(n, 2)
+        """
+        columns = self._columns
+        marker_rows: list[tuple[str, dict[str, np.ndarray]]] = []
+        for marker_label, points in detections.items():
+            points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+            n = len(points)
+            rows = {"x": points[:, 0], "y": points[:, 1]}
+            if scores is not None:
+                rows["score"] = np.asarray(
+                    scores[marker_label], dtype=np.float64
+                ).reshape(n)
+            if factual_detections is not None:
+                factual_points = np.asarray(
+                    factual_detections[marker_label], dtype=np.float64
+                ).reshape(n, 2)
+                rows["x_factual"] = factual_points[:, 0]
+                rows["y_factual"] = factual_points[:, 1]
+
+            rows_columns = (*_CODED_COLUMNS, *rows.keys())
+            if columns is None:
+                columns = rows_columns
+            elif rows_columns != columns:
+                raise ValueError(
+                    f"Columns {rows_columns} differ from columns of written rows {columns}"
+                )
+            marker_rows.append((str(marker_label), rows))
+
+        self._columns = columns
+        for marker_label, rows in marker_rows:
+            n = len(rows["x"])
+            self._buffer.append(
+                {
+                    "image": np.full(n, self._code("image", str(image)), np.int32),
+                    "marker": np.full(n, self._code("marker", marker_label), np.int32),
+                    **rows,
+                }
+            )
+            self._buffered_rows += n
+
+        if self._buffered_rows >= self.chunk_size:
+            self.flush()
+
+    def write_results(self, results) -> None:
+        """
+        Add results of batch processing (objects with attributes image_path, detections,
+         scores, factual_detections, e.g. from core.batch.iter_batch)
+        """
+        for result in results:
+            self.write(
+                result.image_path,
+                result.detections,
+                result.scores,
+                result.factual_detections,
+            )
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+
+        chunk = {
+            column: np.concatenate([rows[column] for rows in self._buffer])
+            for column in self._columns
+        }
+        names = {
+            column: np.array(list(codes), dtype=str)
+            for column, codes in self._codes.items()
+        }
+        if self.file_format == "npz":
+            self._write_npz_chunk(chunk, names)
+        else:
+            # parquet and arrow files get plain string columns
+            for column, column_names in names.items():
+                chunk[column] = column_names[chunk[column]]
+            self._write_arrow_chunk(chunk)
+
+        logger.debug(f"{self._buffered_rows} detections written to {str(self.path)}")
+        self._buffer = []
+        self._buffered_rows = 0
+        self._codes = {column: dict() for column in _CODED_COLUMNS}
+
+    def close(self) -> None:
+        self.flush()
+        if self._arrow_writer is not None:
+            self._arrow_writer.close()
+            self._arrow_writer = None
+
+    def _code(self, column: str, name: str) -> int:
+        codes = self._codes[column]
+        return codes.setdefault(name, len(codes))
+
+    def _write_npz_chunk(
+        self, chunk: dict[str, np.ndarray], names: dict[str, np.ndarray]
+    ) -> None:
+        members = {**chunk, **{f"{c}_names": n for c, n in names.items()}}
+        with zipfile.ZipFile(self.path, mode="a") as archive:
+            for column, values in members.items():
+                with archive.open(
+                    f"{column}_{self._chunk_index:06d}.npy", mode="w", force_zip64=True
+                ) as file:
+                    np.lib.format.write_array(file, values, allow_pickle=False)
+        self._chunk_index += 1
+
+    def _write_arrow_chunk(self, chunk: dict[str, np.ndarray]) -> None:
+        pa = _import_pyarrow(self.file_format)
+        table = pa.table(chunk)
+        if self._arrow_writer is None:
+            if self.file_format == "parquet":
+                self._arrow_writer = pa.parquet.ParquetWriter(self.path, table.schema)
+            else:
+                self._arrow_writer = pa.ipc.new_file(self.path, table.schema)
+        self._arrow_writer.write_table(table)
+
+
+def load_detections(path: pathlib.Path | str) -> dict[str, np.ndarray]:
+    """
+    Read detections written by DetectionsWriter in 'npz' format
+
+    :return: column name -> values of all rows (image and marker columns are decoded to names)
+    """
+    chunks: dict[int, dict[str, np.ndarray]] = dict()
+    with np.load(path, allow_pickle=False) as data:
+        for name in data.files:
+            chunks.setdefault(_npz_chunk_index(name), dict())[_npz_column(name)] = data[
+                name
+            ]
+
+    for chunk in chunks.values():
+        for column in _CODED_COLUMNS:
+            chunk[column] = chunk.pop(f"{column}_names")[chunk[column]]
+
+    columns = next(iter(chunks.values()), dict()).keys()
+    return {
+        column: np.concatenate([chunks[i][column] for i in sorted(chunks)])
+        for column in columns
+    }
+
+
+def _npz_column(member_name: str) -> str:
+    return member_name.rsplit("_", 1)[0]
+
+
+def _npz_chunk_index(member_name: str) -> int:
+    return int(member_name.rsplit("_", 1)[1].removesuffix(".npy"))
+
+
+def _import_pyarrow(file_format: str):
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            f"pyarrow is required for '{file_format}' format, "
+            "use 'npz' format or install pyarrow"
+        )
+    return pyarrow
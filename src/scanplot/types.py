@@ -30,3 +30,15 @@ class ConverterParameters:
     y_max_factual: float
     x_axis_type: Literal["linear", "logscale"]
     y_axis_type: Literal["linear", "logscale"]
+
+
+@dataclass
+class DetectionParameters:
+    mode: Literal["basic", "color", "binary"] = "color"
+    color_delta: int = 100
+    shape_factor: float = 0.6
+    pyramid_levels: int = 0
+    backend: str = "auto"
+    method_name: str = "cv.TM_SQDIFF_NORMED"
+    points_num: float = 30
+    points_density: float = 30
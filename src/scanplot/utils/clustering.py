@@ -5,6 +5,9 @@ from typing import List, Tuple
 import cv2 as cv
 import numpy as np
 from scipy.ndimage import sobel
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
 from sklearn.cluster import DBSCAN, AgglomerativeClustering, MeanShift
 
 logger = logging.getLogger(__name__)
@@ -24,11 +27,157 @@ def agglomerative_clustering(points: np.ndarray, eps: float = 5.5) -> np.ndarray
         labels_pred = agglomerat.fit_predict(points)
     except MemoryError as ex:
         logger.error(f"Number of points: {len(points)} too lot for clustering")
-        raise Exception(f"Number of points: {len(points)} too lot for clustering")
+        raise Exception(
+            f"Number of points: {len(points)} too lot for clustering, use radius_clustering"
+        )
 
     return labels_pred
 
 
+def radius_clustering(points: np.ndarray, eps: float = 5.5) -> np.ndarray:
+    """
+    Merge points closer than eps into clusters (single linkage).
+    Points are hashed into grid cells with diagonal eps, so points of one cell
+     are always in one cluster, and clusters are connected components of graph
+     of neighbouring cells that have a pair of points closer than eps.
+    Memory is linear in number of points (unlike agglomerative_clustering),
+     also for dense clusters.
+    Return array of cluster labels (numbered in order of first point of cluster).
+    """
+    if eps <= 0:
+        raise ValueError("Param eps must be positive")
+
+    n = len(points)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    points = np.asarray(points, dtype=np.float64)
+    cell_size = eps / np.sqrt(2)
+    cells = np.floor(points / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 2
+    # cell key is unique for neighbour offsets up to 2 cells
+    rows_num = cells[:, 1].max() + 3
+    keys = cells[:, 0] * rows_num + cells[:, 1]
+
+    order = np.argsort(keys, kind="stable")
+    cell_keys, cell_starts, cell_sizes = np.unique(
+        keys[order], return_index=True, return_counts=True
+    )
+    sorted_points = points[order]
+
+    edges = [
+        _linked_cells(
+            sorted_points, cell_keys, cell_starts, cell_sizes, dx * rows_num + dy, eps
+        )
+        for dx, dy in _NEIGHBOUR_CELLS
+    ]
+    edges = np.concatenate(edges) if edges else np.zeros((0, 2), dtype=np.int64)
+    n_cells = len(cell_keys)
+    graph = coo_matrix(
+        (np.ones(len(edges), dtype=np.int8), (edges[:, 0], edges[:, 1])),
+        shape=(n_cells, n_cells),
+    )
+    n_clusters, cell_labels = connected_components(graph, directed=False)
+
+    labels_pred = np.empty(n, dtype=np.int64)
+    labels_pred[order] = np.repeat(cell_labels, cell_sizes)
+
+    # renumber clusters in order of their first point
+    first_points = np.full(n_clusters, n, dtype=np.int64)
+    np.minimum.at(first_points, labels_pred, np.arange(n))
+    cluster_ranks = np.empty(n_clusters, dtype=np.int64)
+    cluster_ranks[np.argsort(first_points)] = np.arange(n_clusters)
+    return cluster_ranks[labels_pred]
+
+
+# half of cells within 2 cells distance (cell pairs are unordered)
+_NEIGHBOUR_CELLS = [(0, 1), (0, 2)] + [(dx, dy) for dx in (1, 2) for dy in range(-2, 3)]
+
+# maximal number of point pairs compared at once
+_PAIRS_CHUNK_SIZE = 2**20
+# cells pairs with more point pairs are compared with KD-tree
+_MAX_CELLS_PAIRS = 1024
+
+
+def _linked_cells(
+    sorted_points: np.ndarray,
+    cell_keys: np.ndarray,
+    cell_starts: np.ndarray,
+    cell_sizes: np.ndarray,
+    key_offset: int,
+    eps: float,
+) -> np.ndarray:
+    """
+    Return pairs of cells (indexes in cell_keys), such that second cell key
+     is first cell key + key_offset and some points of cells are closer than eps.
+    Points of small cells are compared pairwise in chunks,
+     large cells are compared with KD-tree.
+    """
+    neighbours = np.searchsorted(cell_keys, cell_keys + key_offset)
+    neighbours = np.minimum(neighbours, len(cell_keys) - 1)
+    has_neighbour = cell_keys[neighbours] == cell_keys + key_offset
+    cell_a, cell_b = np.flatnonzero(has_neighbour), neighbours[has_neighbour]
+
+    pairs_num = cell_sizes[cell_a] * cell_sizes[cell_b]
+    is_large = pairs_num > _MAX_CELLS_PAIRS
+
+    linked = []
+    small_a, small_b = cell_a[~is_large], cell_b[~is_large]
+    pairs_cumsum = np.cumsum(pairs_num[~is_large])
+    total_pairs = pairs_cumsum[-1] if len(pairs_cumsum) else 0
+    chunk_bounds = np.searchsorted(
+        pairs_cumsum, np.arange(_PAIRS_CHUNK_SIZE, total_pairs, _PAIRS_CHUNK_SIZE)
+    )
+    chunk_bounds = np.unique(np.concatenate(([0], chunk_bounds, [len(small_a)])))
+    for start, stop in zip(chunk_bounds[:-1], chunk_bounds[1:]):
+        a, b = small_a[start:stop], small_b[start:stop]
+        is_linked = _cells_linked(sorted_points, cell_starts, cell_sizes, a, b, eps)
+        linked.append(np.stack((a[is_linked], b[is_linked]), axis=1))
+
+    trees = dict()
+    for a, b in zip(cell_a[is_large], cell_b[is_large]):
+        if b not in trees:
+            cell_points = sorted_points[cell_starts[b] : cell_starts[b] + cell_sizes[b]]
+            trees[b] = cKDTree(cell_points)
+        distances, _ = trees[b].query(
+            sorted_points[cell_starts[a] : cell_starts[a] + cell_sizes[a]],
+            distance_upper_bound=eps * (1 + 1e-12),
+        )
+        if np.any(distances <= eps):
+            linked.append(np.array([[a, b]]))
+
+    if not linked:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.concatenate(linked)
+
+
+def _cells_linked(
+    sorted_points: np.ndarray,
+    cell_starts: np.ndarray,
+    cell_sizes: np.ndarray,
+    cell_a: np.ndarray,
+    cell_b: np.ndarray,
+    eps: float,
+) -> np.ndarray:
+    """
+    For every pair of cells, compare all pairs of their points,
+     return whether some points are closer than eps
+    """
+    sizes_a, sizes_b = cell_sizes[cell_a], cell_sizes[cell_b]
+    pairs_num = sizes_a * sizes_b
+    pair_cells = np.repeat(np.arange(len(cell_a)), pairs_num)
+    # index of pair inside its cells pair -> point of cell a and point of cell b
+    pair_index = np.arange(len(pair_cells)) - np.repeat(
+        np.cumsum(pairs_num) - pairs_num, pairs_num
+    )
+    points_a = cell_starts[cell_a][pair_cells] + pair_index // sizes_b[pair_cells]
+    points_b = cell_starts[cell_b][pair_cells] + pair_index % sizes_b[pair_cells]
+
+    diff = sorted_points[points_a] - sorted_points[points_b]
+    is_close = np.einsum("ij,ij->i", diff, diff) <= eps**2
+    return np.bincount(pair_cells[is_close], minlength=len(cell_a)) > 0
+
+
 def meanshift_clustering(points: np.ndarray, bandwidth: float = 4) -> np.ndarray:
     """
     Run Mean-Shift clustering with a given bandwidth.
@@ -51,16 +200,15 @@ def dbscan_clustering(points: np.ndarray, eps: float, min_samples: int) -> np.nd
 
 def simplify_points(points: np.ndarray, labels_pred: np.ndarray) -> np.ndarray:
     """
-    Take clustering result (labeled data) and return array with cluster centers.
+    Take clustering result (labeled data) and return array with cluster centers
+     (in ascending order of labels).
     """
-    unique_labels = np.unique(labels_pred)
-    n = len(unique_labels)
-    cluster_centers = np.zeros((n, 2))
-
-    for i in range(len(unique_labels)):
-        label = unique_labels[i]
-        cluster_indexes = np.where(labels_pred == label)[0]
-        cluster_points = points[cluster_indexes]
-        cluster_centers[i] = np.mean(cluster_points, axis=0)
+    _, inverse, counts = np.unique(labels_pred, return_inverse=True, return_counts=True)
+    cluster_centers = np.zeros((len(counts), 2))
+
+    for axis in range(2):
+        cluster_centers[:, axis] = (
+            np.bincount(inverse, weights=points[:, axis]) / counts
+        )
 
     return cluster_centers
@@ -0,0 +1,68 @@
+import pathlib
+
+import numpy as np
+
+from scanplot.core.batch import run_batch
+from scanplot.types import ConverterParameters, DetectionParameters
+
+DATASETS_DIR = pathlib.Path(__file__).parents[1] / "datasets"
+
+
+def test_run_batch():
+    image_paths = [
+        DATASETS_DIR / "plot_images" / "plot62.png",
+        DATASETS_DIR / "plot_images" / "missing.png",
+    ]
+
+    results = run_batch(
+        image_paths,
+        marker_dir=DATASETS_DIR / "marker_images",
+        params=DetectionParameters(mode="basic"),
+        max_workers=1,
+    )
+
+    result = results[str(image_paths[0])]
+    assert result.error is None
+    assert list(result.detections) == ["marker1", "marker2", "marker3"]
+    assert all(len(points) > 0 for points in result.detections.values())
+    assert all(np.all(scores > 0) for scores in result.scores.values())
+    assert results[str(image_paths[1])].error is not None
+
+
+def test_run_batch_errors(tmp_path):
+    image_paths = [
+        DATASETS_DIR / "plot_images" / "plot62.png",
+        DATASETS_DIR / "plot_images" / "plot103.png",
+    ]
+    # file name without marker index
+    marker_path = DATASETS_DIR / "marker_images" / "plot103_marker1.png"
+    (tmp_path / "plot103_marker1_old.png").write_bytes(marker_path.read_bytes())
+    for marker_path in (DATASETS_DIR / "marker_images").glob("plot62_marker*.png"):
+        (tmp_path / marker_path.name).write_bytes(marker_path.read_bytes())
+    # y pixel coords must grow from top to bottom
+    converter_params = ConverterParameters(
+        0, 100, 0, 100, 0, 1, 0, 1, "linear", "linear"
+    )
+
+    results = run_batch(
+        image_paths,
+        marker_dir=tmp_path,
+        params=DetectionParameters(mode="basic"),
+        converter_params=converter_params,
+        max_workers=1,
+    )
+
+    assert "AssertionError" in results[str(image_paths[0])].error
+    assert "ValueError" in results[str(image_paths[1])].error
+
+
+def test_run_batch_pool_errors():
+    image_path = DATASETS_DIR / "plot_images" / "plot62.png"
+    # task with template that can not be passed to worker process
+    markers = {"marker1": lambda: None}
+
+    results = run_batch([image_path], markers=markers, max_workers=1)
+
+    result = results[str(image_path)]
+    assert result.detections == dict()
+    assert "pickle" in result.error
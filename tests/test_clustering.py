@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from scanplot.utils.clustering import radius_clustering, simplify_points
+
+
+def test_radius_clustering_and_simplify_points():
+    points = np.array(
+        [[0, 0], [3, 0], [6, 0], [50, 50], [52, 50], [100, 0]], dtype=float
+    )
+
+    labels_pred = radius_clustering(points, eps=3.5)
+    centers = simplify_points(points, labels_pred)
+
+    assert len(np.unique(labels_pred)) == 3
+    assert sorted(map(tuple, centers)) == [(3, 0), (51, 50), (100, 0)]
+
+
+@pytest.mark.parametrize("eps", [0, -1.0])
+def test_radius_clustering_non_positive_eps(eps):
+    with pytest.raises(ValueError):
+        radius_clustering(np.zeros((2, 2)), eps=eps)
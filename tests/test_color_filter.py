@@ -0,0 +1,86 @@
+import pathlib
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from scanplot.core.color_filter import (
+    apply_image_mask,
+    color_bitmask,
+    color_distance_maps,
+    filter_by_color_bitmask,
+    filter_by_colors,
+    filtering_bounds,
+    get_dominant_marker_colors,
+    get_filtering_mask,
+)
+from scanplot.core.scanplot_api import Plot
+
+DATASETS_DIR = pathlib.Path(__file__).parent.parent / "datasets"
+
+
+@pytest.mark.parametrize("color_delta", [0, 30, 100, 255])
+def test_filter_by_colors_equals_in_range_filtering(color_delta):
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, size=(50, 70, 3)).astype(np.uint8)
+    colors = rng.random((3, 3)) * 255
+
+    lower_bound_pixels, upper_bound_pixels = filtering_bounds(colors, color_delta)
+    mask = get_filtering_mask(image, lower_bound_pixels, upper_bound_pixels)
+    expected = apply_image_mask(image, mask)
+
+    assert np.array_equal(filter_by_colors(image, colors, color_delta), expected)
+
+
+def test_color_distance_maps_follow_selected_markers():
+    plot = Plot(cv.imread(str(DATASETS_DIR / "plot_images" / "plot59.png")))
+    markers = {
+        f"marker{i}": cv.imread(
+            str(DATASETS_DIR / "marker_images" / f"plot59_marker{i}.png")
+        )
+        for i in (1, 2)
+    }
+    plot.markers = dict(markers)
+    plot._init_roi()
+    plot.apply_roi([])
+    plot.run_matching(mode="color")
+
+    # markers are selected again with other labels
+    plot.markers = {"marker3": markers["marker2"]}
+    plot._init_roi()
+    plot.apply_roi([])
+    plot.run_matching(mode="color")
+
+    assert set(plot._color_distance_maps) == {"marker3"}
+    assert set(plot.refilter_by_colors(color_delta=50)) == {"marker3"}
+
+
+def test_color_bitmask_equals_filtering_by_each_color_set():
+    rng = np.random.default_rng(1)
+    image = rng.integers(0, 256, size=(40, 60, 3)).astype(np.uint8)
+    image[:, 20:40] = 255
+    color_sets = [rng.random((3, 3)) * 255 for _ in range(10)]
+
+    bitmask = color_bitmask(color_distance_maps(image, color_sets), color_delta=60)
+
+    assert bitmask.dtype == np.uint16
+    for bit_index, colors in enumerate(color_sets):
+        expected = filter_by_colors(image, colors, color_delta=60)
+        assert np.array_equal(
+            filter_by_color_bitmask(image, bitmask, bit_index), expected
+        )
+
+
+def test_get_dominant_marker_colors():
+    image = np.full((30, 30, 3), 255, dtype=np.uint8)
+    image[5:15, 5:25] = [200, 30, 10]
+    image[15:25, 5:25] = [20, 180, 40]
+    mask = np.zeros((30, 30), dtype=np.uint8)
+    mask[5:25, 5:25] = 255
+
+    colors = get_dominant_marker_colors(image, n_colors=3)
+    colors_masked = get_dominant_marker_colors(image, n_colors=2, mask=mask)
+
+    assert np.allclose(colors, [[20, 180, 40], [200, 30, 10], [255, 255, 255]])
+    assert np.allclose(colors_masked, [[20, 180, 40], [200, 30, 10]])
+    assert np.array_equal(get_dominant_marker_colors(image, n_colors=3), colors)
@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 
 from scanplot.core.coords_converter import AxisType, CoordinatesConverter
@@ -55,3 +56,31 @@ def test_from_pixel_logscale(x_px, y_px, x_factual, y_factual, tolerance):
     x_result, y_result = converter.from_pixel(x_pixel=x_px, y_pixel=y_px)
     assert abs(x_result - x_factual) < tolerance
     assert abs(y_result - y_factual) < tolerance
+
+
+def test_to_pixel_and_detections_from_pixel():
+    converter_params = ConverterParameters(
+        x_min_px=127,
+        x_max_px=433,
+        y_min_px=428,
+        y_max_px=146,
+        x_min_factual=1e5,
+        x_max_factual=1e9,
+        y_min_factual=0,
+        y_max_factual=0.8,
+        x_axis_type="logscale",
+        y_axis_type="linear",
+    )
+    converter = CoordinatesConverter(converter_params)
+
+    points = np.array([[80.5, 364], [280.5, 217], [500, 10]])
+    detections = converter.detections_from_pixel(
+        {"marker1": points[:2], "marker2": points[2:]}
+    )
+    x_factual, y_factual = converter.from_pixel(points[:, 0], points[:, 1])
+
+    assert np.allclose(
+        np.concatenate(list(detections.values())),
+        np.stack((x_factual, y_factual), axis=1),
+    )
+    assert np.allclose(converter.to_pixel(x_factual, y_factual), points.T)
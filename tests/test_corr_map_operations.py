@@ -0,0 +1,63 @@
+import numpy as np
+
+from scanplot.core.corr_map_operations import get_first_N_maximums, local_maxima
+from scanplot.core.peak_index import PeakIndex
+
+
+def test_local_maxima():
+    correlation_map = np.zeros((20, 30), dtype=np.float32)
+    correlation_map[5, 6] = 0.9
+    correlation_map[5, 7] = 0.5
+    correlation_map[15, 20] = 0.7
+    correlation_map[0, 0] = np.nan
+
+    points, values = local_maxima(correlation_map, treshold=0.6)
+
+    assert sorted(map(tuple, points)) == [(6, 5), (20, 15)]
+    assert sorted(values) == [np.float32(0.7), np.float32(0.9)]
+
+
+def test_peak_index():
+    rng = np.random.default_rng(0)
+    correlation_map = rng.random((50, 60)).astype(np.float32)
+    peak_index = PeakIndex(correlation_map, min_treshold=0.2)
+
+    for treshold in [0.2, 0.5, 0.9, 1.1]:
+        expected_points, _ = local_maxima(correlation_map, treshold)
+        points, scores = peak_index.peaks(treshold)
+        assert sorted(map(tuple, points)) == sorted(map(tuple, expected_points))
+        assert np.all(np.diff(scores) <= 0)
+
+
+def test_local_maxima_plateaus_and_top_k():
+    correlation_map = np.zeros((50, 50), dtype=np.float32)
+    correlation_map[10:13, 10:15] = 0.8
+    correlation_map[30, 30] = 0.9
+    correlation_map[31, 31] = 0.5
+
+    points, values = local_maxima(
+        correlation_map, 0.1, neighbourhood_size=(5, 5), merge_plateaus=True
+    )
+    assert sorted(map(tuple, points)) == [(12, 11), (30, 30)]
+
+    points, values = local_maxima(correlation_map, 0.1, merge_plateaus=True, top_k=1)
+    assert list(map(tuple, points)) == [(30, 30)]
+    assert list(values) == [np.float32(0.9)]
+
+
+def test_get_first_N_maximums():
+    rng = np.random.default_rng(0)
+    corr_map = rng.random((30, 40))
+
+    for N in [1, 10, 1200, 5000]:
+        maximums = get_first_N_maximums(corr_map, N)
+        # full argsort result
+        expected_indexes = corr_map.ravel().argsort()[-N:]
+        assert [index for _, index in maximums] == [
+            np.unravel_index(i, corr_map.shape) for i in expected_indexes
+        ]
+
+    maximums = get_first_N_maximums(corr_map, 5, neighbourhood_size=7)
+    values = [value for value, _ in maximums]
+    assert values == sorted(values)
+    assert values[-1] == corr_map.max()
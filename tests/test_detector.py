@@ -0,0 +1,61 @@
+import pathlib
+
+import cv2 as cv
+import pytest
+
+from scanplot.core.detector import Detector
+from scanplot.core.scanplot_api import Plot
+
+DATASETS_DIR = pathlib.Path(__file__).parents[1] / "datasets"
+
+
+@pytest.fixture(scope="module")
+def plot():
+    plot = Plot(cv.imread(str(DATASETS_DIR / "plot_images" / "plot59.png")))
+    marker_paths = sorted((DATASETS_DIR / "marker_images").glob("plot59_marker*.png"))
+    plot.markers = {
+        f"marker{i + 1}": cv.imread(str(path)) for i, path in enumerate(marker_paths)
+    }
+    plot._init_roi()
+    plot.apply_roi([])
+    plot.run_matching(mode="basic")
+    return plot
+
+
+def _detect(plot, marker, points_num, points_density):
+    detector = Detector(plot, marker)
+    detector.points_num = points_num
+    detector.points_density = points_density
+    return [tuple(point) for point in detector.detect_points().tolist()]
+
+
+@pytest.mark.parametrize(
+    "marker, points_num, expected_counts",
+    [
+        ("marker1", 10, [17, 17, 17]),
+        ("marker1", 30, [31, 30, 27]),
+        ("marker1", 90, [336, 308, 80]),
+        ("marker2", 10, [46, 46, 44]),
+        ("marker2", 30, [79, 78, 66]),
+        ("marker2", 90, [3396, 1684, 290]),
+    ],
+)
+def test_detect_points_count(plot, marker, points_num, expected_counts):
+    detections = [_detect(plot, marker, points_num, d) for d in (10, 30, 90)]
+
+    assert [len(points) for points in detections] == expected_counts
+
+
+def test_detect_points_local_maxima(plot):
+    # only local maxima of correlation map are NMS candidates (see PeakIndex)
+    points = _detect(plot, "marker1", 30, 30)
+    assert (114, 92) in points
+    assert (114, 94) not in points
+
+    # equal scores are processed in raster order (see NMSIndex)
+    points = _detect(plot, "marker2", 10, 90)
+    assert {(106, 177), (277, 74)} <= set(points)
+    assert not {(98, 182), (285, 78)} & set(points)
+
+    points = _detect(plot, "marker2", 30, 10)
+    assert (285, 141) not in points
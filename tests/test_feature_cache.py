@@ -0,0 +1,99 @@
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from scanplot.core.feature_cache import ImageFeatureCache
+from scanplot.core.hough_transform import image_edge_features
+
+N_BINS = 90
+
+
+@pytest.fixture
+def images():
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, size=(40, 50, 3), dtype=np.uint8) for _ in range(3)]
+
+
+def test_cache_hit_returns_same_features(images):
+    feature_cache = ImageFeatureCache()
+
+    features = image_edge_features(images[0], N_BINS, feature_cache=feature_cache)
+    features_cached = image_edge_features(
+        np.copy(images[0]), N_BINS, feature_cache=feature_cache
+    )
+
+    assert feature_cache.misses == 1
+    assert feature_cache.hits == 1
+    assert features_cached is features
+    for feature in (features.edge_i, features.edge_j, features.edge_bins):
+        assert not feature.flags.writeable
+
+
+def test_cached_features_are_compact(images):
+    features = image_edge_features(images[0], N_BINS)
+
+    assert features.shape == (40, 50)
+    assert features.edge_i.dtype == np.int32
+    assert features.edge_j.dtype == np.int32
+    assert features.edge_bins.dtype == np.int16
+    assert features.nbytes == 10 * len(features.edge_i)
+
+
+def test_cache_key_depends_on_params(images):
+    feature_cache = ImageFeatureCache()
+
+    image_edge_features(images[0], N_BINS, 10, 50, feature_cache=feature_cache)
+    image_edge_features(images[0], N_BINS, 10, 100, feature_cache=feature_cache)
+    image_edge_features(images[0], 2 * N_BINS, 10, 50, feature_cache=feature_cache)
+
+    assert feature_cache.misses == 3
+    assert len(feature_cache) == 3
+
+
+def test_cache_key_is_computed_once_per_miss(images):
+    feature_cache = ImageFeatureCache()
+
+    with mock.patch.object(
+        ImageFeatureCache, "key", wraps=ImageFeatureCache.key
+    ) as key:
+        image_edge_features(images[0], N_BINS, feature_cache=feature_cache)
+
+    assert key.call_count == 1
+    assert len(feature_cache) == 1
+
+
+def test_cache_evicts_lru_entries_over_max_bytes(images):
+    entry_nbytes = [image_edge_features(image, N_BINS).nbytes for image in images]
+    feature_cache = ImageFeatureCache(max_bytes=max(entry_nbytes) * 2)
+
+    image_edge_features(images[0], N_BINS, feature_cache=feature_cache)
+    image_edge_features(images[1], N_BINS, feature_cache=feature_cache)
+    image_edge_features(images[0], N_BINS, feature_cache=feature_cache)  # hit
+    image_edge_features(
+        images[2], N_BINS, feature_cache=feature_cache
+    )  # evicts images[1]
+
+    assert len(feature_cache) == 2
+    assert feature_cache.nbytes <= feature_cache.max_bytes
+    assert feature_cache.get(ImageFeatureCache.key(images[0], N_BINS, 10, 50))
+    assert feature_cache.get(ImageFeatureCache.key(images[1], N_BINS, 10, 50)) is None
+
+
+def test_cache_skips_entries_over_max_bytes(images):
+    feature_cache = ImageFeatureCache(max_bytes=1)
+
+    image_edge_features(images[0], N_BINS, feature_cache=feature_cache)
+
+    assert len(feature_cache) == 0
+    assert feature_cache.nbytes == 0
+
+
+def test_cache_does_not_freeze_input_image():
+    image = np.zeros((30, 30), dtype=np.uint8)
+    image[10:20, 10:20] = 255
+    feature_cache = ImageFeatureCache()
+
+    image_edge_features(image, N_BINS, feature_cache=feature_cache)
+
+    assert image.flags.writeable
@@ -0,0 +1,184 @@
+import pathlib
+import tracemalloc
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from scanplot.core import hough_transform
+from scanplot.core.hough_transform import (
+    build_hough_model,
+    fill_accumulator,
+    fill_accumulators,
+    generalized_hough_transform,
+)
+from scanplot.core.r_table import RTable
+
+DATASETS_DIR = pathlib.Path(__file__).parent.parent / "datasets"
+
+
+def load_plot_and_marker(plot_name: str, marker_name: str):
+    plot_image = cv.imread(str(DATASETS_DIR / "plot_images" / f"{plot_name}.png"))
+    marker_image = cv.imread(
+        str(DATASETS_DIR / "marker_images" / f"{plot_name}_{marker_name}.png")
+    )
+    return plot_image, marker_image
+
+
+@pytest.mark.parametrize(
+    "plot_name, marker_name",
+    [("plot59", "marker1"), ("plot51", "marker1"), ("plot62", "marker2")],
+)
+def test_vectorized_accumulator_equals_reference(plot_name, marker_name):
+    plot_image, marker_image = load_plot_and_marker(plot_name, marker_name)
+    hough_model = build_hough_model(marker_image)
+
+    accumulator_reference = fill_accumulator(
+        hough_model, plot_image, backend="reference"
+    )
+    accumulator_vectorized = fill_accumulator(
+        hough_model, plot_image, backend="vectorized"
+    )
+
+    assert accumulator_vectorized.dtype == accumulator_reference.dtype
+    assert np.array_equal(accumulator_vectorized, accumulator_reference)
+
+
+def test_vectorized_accumulator_chunked_votes(monkeypatch):
+    plot_image, marker_image = load_plot_and_marker("plot59", "marker1")
+    hough_model = build_hough_model(marker_image)
+
+    accumulator_reference = fill_accumulator(
+        hough_model, plot_image, backend="reference"
+    )
+    monkeypatch.setattr(hough_transform, "VOTES_CHUNK_SIZE", 1000)
+    accumulator_vectorized = fill_accumulator(hough_model, plot_image)
+
+    assert np.array_equal(accumulator_vectorized, accumulator_reference)
+
+
+@pytest.mark.parametrize("n_bins, bin_tolerance", [(360, 0), (36, 1), (8, 2)])
+def test_vectorized_accumulator_with_bin_tolerance(n_bins, bin_tolerance):
+    plot_image, marker_image = load_plot_and_marker("plot59", "marker2")
+    hough_model = build_hough_model(marker_image, n_bins=n_bins)
+
+    accumulator_reference = fill_accumulator(
+        hough_model, plot_image, backend="reference", bin_tolerance=bin_tolerance
+    )
+    accumulator_vectorized = fill_accumulator(
+        hough_model, plot_image, bin_tolerance=bin_tolerance
+    )
+
+    assert np.array_equal(accumulator_vectorized, accumulator_reference)
+
+
+def test_r_table_save_load(tmp_path):
+    _, marker_image = load_plot_and_marker("plot51", "marker1")
+    hough_model = build_hough_model(marker_image, n_bins=90)
+
+    hough_model.save(tmp_path / "r_table.npz")
+    hough_model_loaded = RTable.load(tmp_path / "r_table.npz")
+
+    assert hough_model_loaded.n_bins == 90
+    assert hough_model_loaded.reference_point == hough_model.reference_point
+    assert np.array_equal(hough_model_loaded.offsets, hough_model.offsets)
+    assert np.array_equal(hough_model_loaded.displacements, hough_model.displacements)
+
+
+def test_r_table_subsampling():
+    _, marker_image = load_plot_and_marker("plot51", "marker1")
+    hough_model_full = build_hough_model(marker_image)
+    hough_model = build_hough_model(marker_image, max_points=20)
+
+    assert len(hough_model) == 20
+    assert len(hough_model_full) > 20
+    assert hough_model.offsets[-1] == 20
+
+
+def test_multi_template_hough_transform():
+    plot_image = cv.imread(str(DATASETS_DIR / "plot_images" / "plot62.png"))
+    templates = [
+        cv.imread(str(DATASETS_DIR / "marker_images" / f"plot62_marker{i}.png"))
+        for i in (1, 2, 3)
+    ]
+
+    accumulators = generalized_hough_transform(plot_image, templates)
+
+    assert len(accumulators) == len(templates)
+    for accumulator, template in zip(accumulators, templates):
+        accumulator_single = generalized_hough_transform(plot_image, template)
+        assert np.array_equal(accumulator, accumulator_single)
+
+
+def test_multi_template_hough_transform_memory():
+    plot_image = cv.imread(str(DATASETS_DIR / "plot_images" / "plot66.png"))
+    plot_image = np.tile(plot_image, (2, 2, 1))
+    templates = [
+        cv.imread(str(DATASETS_DIR / "marker_images" / f"plot66_marker{i}.png"))
+        for i in (1, 2, 3)
+    ]
+
+    def peak_memory(function):
+        tracemalloc.start()
+        result = function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return result, peak
+
+    accumulators, single_pass_peak = peak_memory(
+        lambda: generalized_hough_transform(plot_image, templates)
+    )
+    separate_accumulators, separate_peak = peak_memory(
+        lambda: [generalized_hough_transform(plot_image, t) for t in templates]
+    )
+
+    # single pass must not use more memory than separate calls
+    assert single_pass_peak <= separate_peak
+    for accumulator, separate_accumulator in zip(accumulators, separate_accumulators):
+        assert np.array_equal(accumulator, separate_accumulator)
+
+
+@pytest.mark.parametrize("n_workers, bin_tolerance", [(1, 0), (4, 0), (3, 1)])
+def test_parallel_accumulator_equals_vectorized(n_workers, bin_tolerance):
+    plot_image, marker_image = load_plot_and_marker("plot62", "marker1")
+    hough_model = build_hough_model(marker_image)
+
+    accumulator_vectorized = fill_accumulator(
+        hough_model, plot_image, bin_tolerance=bin_tolerance
+    )
+    accumulator_parallel = fill_accumulator(
+        hough_model,
+        plot_image,
+        backend="parallel",
+        bin_tolerance=bin_tolerance,
+        n_workers=n_workers,
+    )
+
+    assert np.array_equal(accumulator_parallel, accumulator_vectorized)
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_windowed_accumulators(parallel):
+    plot_image = cv.imread(str(DATASETS_DIR / "plot_images" / "plot62.png"))
+    hough_models = [
+        build_hough_model(
+            cv.imread(str(DATASETS_DIR / "marker_images" / f"plot62_marker{i}.png"))
+        )
+        for i in (1, 2)
+    ]
+    accumulators_full = [fill_accumulator(m, plot_image) for m in hough_models]
+    windows = [(5, 300, 20, 250), (100, 479, 0, 100)]
+
+    accumulators, maximums = fill_accumulators(
+        hough_models, plot_image, windows=windows, parallel=parallel, n_workers=3
+    )
+
+    for accumulator, maximum, accumulator_full, window in zip(
+        accumulators, maximums, accumulators_full, windows
+    ):
+        x_min, x_max, y_min, y_max = window
+        assert accumulator.dtype == np.uint16
+        assert np.array_equal(
+            accumulator, accumulator_full[y_min : y_max + 1, x_min : x_max + 1]
+        )
+        assert maximum == accumulator_full.max()
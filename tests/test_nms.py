@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from scanplot.core.nms import NMSIndex, apply_nms, grid_prefilter
+
+
+@pytest.mark.parametrize("iou_treshold", [0.0, 0.1, 0.3, 0.5, 0.7, 1.0])
+def test_nms_index_equals_apply_nms(iou_treshold):
+    rng = np.random.default_rng(0)
+    correlation_map = rng.random((100, 120))
+    points = np.unique(rng.integers(0, 90, (500, 2)), axis=0)
+    scores = correlation_map[points[:, 1], points[:, 0]]
+    points = points[np.argsort(-scores)]
+
+    nms_index = NMSIndex(points, bbox_width=9, bbox_height=7)
+
+    for n_candidates in [len(points), 100]:
+        expected = apply_nms(points[:n_candidates], correlation_map, iou_treshold, 9, 7)
+        result = nms_index.detect(n_candidates, iou_treshold)
+        assert np.array_equal(result, expected)
+
+
+def test_grid_prefilter():
+    points = np.array([[0, 0], [1, 2], [5, 5], [5, 5], [9, 1]])
+    scores = np.array([0.5, 0.9, 0.3, 0.4, 0.1])
+
+    result = grid_prefilter(points, scores, cell_size=4)
+
+    assert result.tolist() == [[1, 2], [5, 5], [9, 1]]
@@ -0,0 +1,19 @@
+import cv2 as cv
+import numpy as np
+import pytest
+
+from scanplot.core.preprocess import foreground_under_template
+
+
+@pytest.mark.parametrize("mask_density", [1.0, 0.5])
+def test_foreground_under_template_equals_ccorr(mask_density):
+    rng = np.random.default_rng(0)
+    foreground = rng.random((60, 80)) > 0.99
+    template_mask = (rng.random((9, 13)) < mask_density).astype(np.uint8) * 255
+
+    expected = cv.matchTemplate(
+        foreground.astype(np.uint8), (template_mask > 0).astype(np.uint8), cv.TM_CCORR
+    )
+    result = foreground_under_template(foreground, template_mask)
+
+    assert np.array_equal(result, expected > 0.1)
@@ -0,0 +1,18 @@
+import cv2 as cv
+import numpy as np
+
+from scanplot.io import load_image, probe_image
+
+
+def test_load_image_reduced_and_cached(tmp_path):
+    image = np.random.default_rng(0).integers(0, 256, size=(64, 48, 3), dtype=np.uint8)
+    img_path = tmp_path / "image.png"
+    cv.imwrite(str(img_path), image)
+
+    assert probe_image(img_path) == (48, 64, 3)
+    assert load_image(img_path, reduce_factor=4).shape == (16, 12, 3)
+
+    cached = load_image(img_path, cache_dir=tmp_path / "cache")
+    cached_again = load_image(img_path, cache_dir=tmp_path / "cache")
+    assert isinstance(cached_again, np.memmap)
+    assert np.array_equal(cached, image) and np.array_equal(cached_again, image)
@@ -0,0 +1,127 @@
+import sys
+
+import numpy as np
+import pytest
+
+from scanplot.io import DetectionsWriter, load_detections
+
+
+def test_detections_writer_npz_append(tmp_path):
+    path = tmp_path / "detections.npz"
+    detections = {
+        "marker1": np.array([[1.0, 2.0], [3.0, 4.0]]),
+        "marker2": np.array([[5.0, 6.0]]),
+    }
+    scores = {"marker1": np.array([0.9, 0.8]), "marker2": np.array([0.7])}
+
+    with DetectionsWriter(path, chunk_size=2) as writer:
+        writer.write("plot1.png", detections, scores)
+        writer.write(
+            "plot2.png",
+            {"marker1": detections["marker1"]},
+            {"marker1": scores["marker1"]},
+        )
+    with DetectionsWriter(path, append=True) as writer:
+        writer.write(
+            "plot3.png",
+            {"marker2": detections["marker2"]},
+            {"marker2": scores["marker2"]},
+        )
+
+    columns = load_detections(path)
+
+    assert set(columns) == {"image", "marker", "x", "y", "score"}
+    assert columns["image"].tolist() == ["plot1.png"] * 3 + ["plot2.png"] * 2 + [
+        "plot3.png"
+    ]
+    assert columns["marker"].tolist() == [
+        "marker1",
+        "marker1",
+        "marker2",
+        "marker1",
+        "marker1",
+        "marker2",
+    ]
+    assert columns["x"].tolist() == [1, 3, 5, 1, 3, 5]
+    assert columns["score"].tolist() == [0.9, 0.8, 0.7, 0.9, 0.8, 0.7]
+
+    with pytest.raises(ValueError):
+        with DetectionsWriter(tmp_path / "other.npz") as writer:
+            writer.write("plot1.png", detections, scores)
+            writer.write("plot2.png", detections)
+
+
+def test_detections_writer_npz_append_columns_mismatch(tmp_path):
+    path = tmp_path / "detections.npz"
+    detections = {"marker1": np.array([[1.0, 2.0], [3.0, 4.0]])}
+    scores = {"marker1": np.array([0.9, 0.8])}
+
+    with DetectionsWriter(path) as writer:
+        writer.write("plot1.png", detections)
+
+    with pytest.raises(ValueError):
+        with DetectionsWriter(path, append=True) as writer:
+            writer.write("plot2.png", detections, scores)
+
+    assert load_detections(path)["x"].tolist() == [1, 3]
+
+
+def test_detections_writer_invalid_image_rows(tmp_path):
+    path = tmp_path / "detections.npz"
+    detections = {
+        "marker1": np.array([[1.0, 2.0], [3.0, 4.0]]),
+        "marker2": np.array([[5.0, 6.0]]),
+    }
+
+    with DetectionsWriter(path) as writer:
+        writer.write(
+            "plot1.png",
+            {"marker1": detections["marker1"]},
+            {"marker1": np.array([0.9, 0.8])},
+        )
+        # scores of marker2 have wrong shape, so no rows of plot2 are written
+        with pytest.raises(ValueError):
+            writer.write(
+                "plot2.png",
+                detections,
+                {"marker1": np.array([0.9, 0.8]), "marker2": np.array([0.7, 0.6])},
+            )
+
+    columns = load_detections(path)
+    assert columns["image"].tolist() == ["plot1.png"] * 2
+    # image and marker names are stored once per chunk
+    with np.load(path) as data:
+        assert data["image_000000"].dtype == np.int32
+        assert data["image_names_000000"].tolist() == ["plot1.png"]
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+def test_detections_writer_arrow(tmp_path, file_format):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    path = tmp_path / f"detections.{file_format}"
+    detections = {
+        "marker1": np.array([[1.0, 2.0], [3.0, 4.0]]),
+        "marker2": np.array([[5.0, 6.0]]),
+    }
+
+    with DetectionsWriter(path, file_format=file_format, chunk_size=2) as writer:
+        writer.write("plot1.png", detections)
+        writer.write("plot2.png", {"marker2": detections["marker2"]})
+
+    if file_format == "parquet":
+        table = pa.parquet.read_table(path)
+    else:
+        table = pa.ipc.open_file(path).read_all()
+    assert table.column_names == ["image", "marker", "x", "y"]
+    assert table.column("image").to_pylist() == ["plot1.png"] * 3 + ["plot2.png"]
+    assert table.column("x").to_pylist() == [1, 3, 5, 5]
+
+
+def test_detections_writer_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+
+    with pytest.raises(ImportError):
+        DetectionsWriter(tmp_path / "detections.parquet", file_format="parquet")
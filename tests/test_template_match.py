@@ -0,0 +1,203 @@
+import pathlib
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from scanplot.core.fft_template_match import fft_match_template
+from scanplot.core.matching_backends import (
+    available_matching_backends,
+    select_matching_backend,
+)
+from scanplot.core.numba_template_match import (
+    TM_SQDIFF_NORMED_MODIFICATION,
+    numba_match_template,
+)
+from scanplot.core.process_template import (
+    center_object_on_template_image,
+    get_template_mask,
+)
+from scanplot.core.pyramid import max_pyramid_levels
+from scanplot.core.scanplot_api import Plot
+from scanplot.core.template_match import template_match
+from scanplot.core.windowed_match import match_in_windows, roi_windows, windows_coverage
+from scanplot.utils.convolution_from_stratch import (
+    sqdiff_normed,
+    sqdiff_normed_modification,
+)
+
+DATASETS_DIR = pathlib.Path(__file__).parent.parent / "datasets"
+
+
+@pytest.fixture
+def plot_and_marker():
+    plot_image = cv.imread(str(DATASETS_DIR / "plot_images" / "plot62.png"))
+    marker_image = cv.imread(str(DATASETS_DIR / "marker_images" / "plot62_marker1.png"))
+    template_mask, _ = get_template_mask(marker_image)
+    template, template_mask = center_object_on_template_image(
+        marker_image, template_mask
+    )
+    return plot_image, template, template_mask
+
+
+@pytest.mark.parametrize(
+    "method", [cv.TM_SQDIFF, cv.TM_SQDIFF_NORMED, cv.TM_CCORR, cv.TM_CCORR_NORMED]
+)
+@pytest.mark.parametrize("use_mask", [True, False])
+def test_fft_match_template_equals_opencv(plot_and_marker, method, use_mask):
+    plot_image, template, template_mask = plot_and_marker
+    mask = template_mask if use_mask else None
+
+    correlation_map_cv = cv.matchTemplate(plot_image, template, method, mask=mask)
+    correlation_map_fft = fft_match_template(plot_image, template, method, mask=mask)
+
+    assert correlation_map_fft.shape == correlation_map_cv.shape
+    scale = np.max(np.abs(correlation_map_cv))
+    assert np.allclose(correlation_map_fft, correlation_map_cv, atol=1e-5 * scale)
+
+
+def test_fft_sqdiff_normed_equals_formula(plot_and_marker):
+    plot_image, template, template_mask = plot_and_marker
+    h, w = template.shape[0], template.shape[1]
+    mask_binary = np.repeat((template_mask > 0)[:, :, None], 3, axis=2).astype(
+        np.float64
+    )
+
+    correlation_map = fft_match_template(
+        plot_image, template, cv.TM_SQDIFF_NORMED, mask=template_mask
+    )
+
+    for y, x in [(0, 0), (100, 200), (150, 33), (240, 400)]:
+        image_part = plot_image[y : y + h, x : x + w].astype(np.float64)
+        expected = sqdiff_normed(image_part, template.astype(np.float64), mask_binary)
+        assert correlation_map[y, x] == pytest.approx(expected, abs=1e-5)
+
+
+def test_template_match_backends(plot_and_marker):
+    plot_image, template, template_mask = plot_and_marker
+
+    correlation_map_cv, max_cv = template_match(
+        plot_image, template, template_mask, norm_result=True, backend="opencv"
+    )
+    correlation_map_fft, max_fft = template_match(
+        plot_image, template, template_mask, norm_result=True, backend="fft"
+    )
+
+    assert max_fft == pytest.approx(max_cv, abs=1e-5)
+    assert np.allclose(correlation_map_fft, correlation_map_cv, atol=1e-5)
+
+
+def test_auto_backend_selection(plot_and_marker):
+    plot_image, template, template_mask = plot_and_marker
+    large_image = np.tile(plot_image, (3, 3, 1))
+    large_template = cv.resize(template, (128, 128))
+    large_template_mask = cv.resize(template_mask, (128, 128))
+
+    method = cv.TM_SQDIFF_NORMED
+
+    backend = select_matching_backend(large_image, template, method, template_mask)
+    assert backend.name == "opencv"
+    backend = select_matching_backend(
+        plot_image, large_template, method, large_template_mask
+    )
+    assert backend.name == "fft"
+
+
+@pytest.mark.parametrize(
+    "method_name", ["cv.TM_SQDIFF_NORMED", "sqdiff_normed_modification"]
+)
+def test_match_in_windows_equals_dense_matching(plot_and_marker, method_name):
+    plot_image, template, template_mask = plot_and_marker
+    dense_map = Plot._match_single_marker(
+        plot_image, template, template_mask, shape_factor=0.6, method_name=method_name
+    )
+
+    height, width = dense_map.shape
+    windows = [(0, width // 2, 0, height), (width // 2, width, 0, height)]
+    windowed_map = match_in_windows(
+        plot_image, template, template_mask, 0.6, windows, method_name=method_name
+    )
+
+    assert np.all(np.isfinite(dense_map))
+    assert np.allclose(windowed_map, dense_map)
+
+
+def test_windows_coverage():
+    windows = [(0, 9, 0, 9), (5, 14, 5, 14)]
+
+    assert windows_coverage(windows, (20, 20)) == pytest.approx(175 / 400)
+    assert windows_coverage([], (20, 20)) == 0
+
+
+def test_no_pyramid_for_small_image_or_template():
+    assert max_pyramid_levels((500, 500), (40, 40), 2) == 0
+    assert max_pyramid_levels((1200, 1600), (40, 40), 2) == 2
+    assert max_pyramid_levels((1200, 1600), (20, 20), 2) == 1
+    assert max_pyramid_levels((1200, 1600), (12, 12), 2) == 0
+
+
+def test_roi_windows():
+    roi = np.zeros((100, 200), dtype=np.uint8)
+    roi[10:30, 50:90] = 1
+    roi[80:100, 0:20] = 1
+
+    windows = roi_windows(roi, template_shape=(15, 25, 3))
+
+    assert sorted(windows) == [(0, 19, 66, 85), (26, 89, 0, 29)]
+
+
+def test_numba_sqdiff_normed_equals_opencv(plot_and_marker):
+    plot_image, template, template_mask = plot_and_marker
+
+    correlation_map_cv = cv.matchTemplate(
+        plot_image, template, cv.TM_SQDIFF_NORMED, mask=template_mask
+    )
+    correlation_map_numba = numba_match_template(
+        plot_image, template, cv.TM_SQDIFF_NORMED, mask=template_mask
+    )
+
+    assert np.allclose(
+        correlation_map_numba, correlation_map_cv, atol=1e-4, equal_nan=True
+    )
+
+
+def test_numba_sqdiff_normed_modification_equals_formula():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, size=(30, 40, 3)).astype(np.float64)
+    image[:, :15] = 255
+    template = rng.integers(0, 256, size=(6, 7, 3)).astype(np.float64)
+    template_mask = (rng.random((6, 7)) > 0.3).astype(np.uint8)
+    image_mask = np.any(image != 255, axis=2).astype(np.uint8)
+
+    correlation_map = numba_match_template(
+        image, template, TM_SQDIFF_NORMED_MODIFICATION, mask=template_mask
+    )
+
+    template_mask_rgb = np.repeat(template_mask[:, :, np.newaxis], 3, axis=2)
+    for y, x in [(0, 0), (5, 12), (10, 20), (24, 33)]:
+        expected = sqdiff_normed_modification(
+            image[y : y + 6, x : x + 7],
+            template,
+            template_mask_rgb,
+            image_mask[y : y + 6, x : x + 7],
+            template_mask,
+            np.sum(template_mask),
+        )
+        assert np.isclose(correlation_map[y, x], expected, equal_nan=True)
+    assert np.isnan(correlation_map[0, 0])
+
+
+def test_template_match_backend_validation(plot_and_marker):
+    plot_image, template, template_mask = plot_and_marker
+    assert {"opencv", "fft", "numba"} <= set(available_matching_backends())
+
+    with pytest.raises(ValueError):
+        template_match(plot_image, template, template_mask, backend="unknown")
+    with pytest.raises(ValueError):
+        template_match(
+            plot_image,
+            template,
+            template_mask,
+            method_name="cv.TM_CCOEFF",
+            backend="numba",
+        )